@@ -9,10 +9,13 @@ import sys
 
 import requests
 
+from .modules.cache import MetadataCache
 from .modules.config import USAGE_INFO, load_config
+from .modules.jar_store import JarStore
 from .modules.modpack import install_modpack
 from .modules.mods import CurseforgeMod, Mod, ModrinthMod, ModTable
 from .modules.search import CurseforgeSearch, ModrinthSearch
+from .modules.staging import StagedInstall
 
 
 def main():
@@ -26,6 +29,26 @@ def main():
     except IndexError:
         keyword = ""
 
+    # Inspect or clear the metadata cache
+    if keyword in {"--cache", "--clear-cache"}:
+        cache = MetadataCache()
+        jar_store = JarStore()
+        if keyword == "--clear-cache":
+            cache.clear()
+            jar_store.clear()
+            print("\nCaches cleared.")
+        print(f"\n{cache.info()}\n")
+        failures = cache.failures()
+        if failures:
+            print(f"Mods known to fail ({len(failures)}):")
+            for failure in failures:
+                print(f"    - {failure}")
+            print()
+        print(f"{jar_store.path}\n"
+              f"{jar_store.size() / 1024 / 1024:.1f} MB "
+              f"of {jar_store.max_bytes / 1024 / 1024:.0f} MB\n")
+        sys.exit(0)
+
     # Load configuration
     cfg = load_config()
 
@@ -33,6 +56,14 @@ def main():
     if keyword in {"-h", "--help"}:
         print(USAGE_INFO)
 
+    # Restore the mods folder of the previous build
+    elif keyword == "--rollback":
+        try:
+            StagedInstall(cfg["mods_path"]).rollback()
+            print("\nPrevious build restored.\n")
+        except (ValueError, OSError) as exc:
+            print(f"\nUnable to roll back: {exc}\n")
+
     # Build modpack
     elif os.path.isfile(keyword):
         install_modpack(keyword, cfg)
@@ -0,0 +1,444 @@
+"""
+Contains the persistent on-disk cache for mod metadata.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from dataclasses import dataclass
+from time import time
+
+from .config import (METADATA_CACHE_MAX_MB, METADATA_CACHE_PATH,
+                     METADATA_CACHE_TTL, NEGATIVE_CACHE_TTL)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    immutable INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS failures (
+    provider TEXT NOT NULL,
+    mod_id TEXT NOT NULL,
+    minecraft_version TEXT NOT NULL,
+    loader TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    reason TEXT NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (provider, mod_id, minecraft_version, loader, kind)
+);
+"""
+
+
+@dataclass
+class CacheInfo:
+    """
+    Represents a summary of the contents of the metadata cache.
+    """
+
+    path: str = METADATA_CACHE_PATH
+    entries: int = 0
+    immutable_entries: int = 0
+    size_bytes: int = 0
+    max_bytes: int = 0
+    failures: int = 0
+
+    def __str__(self) -> str:
+        return (f"{self.path}\n"
+                f"{self.entries} entries "
+                f"({self.immutable_entries} never expire), "
+                f"{self.size_bytes / 1024 / 1024:.1f} MB "
+                f"of {self.max_bytes / 1024 / 1024:.0f} MB, "
+                f"{self.failures} known failures")
+
+
+@dataclass
+class NegativeEntry:
+    """
+    Represents a lookup known to fail, such as a mod without a file for a
+    minecraft version and loader.
+    """
+
+    provider: str
+    mod_id: str
+    minecraft_version: str
+    loader: str
+    kind: str
+    reason: str
+    expires_in: float = 0.0
+
+    def __str__(self) -> str:
+        return (f"{self.provider} {self.mod_id} "
+                f"({self.minecraft_version} {self.loader}): {self.reason} "
+                f"Checked again in {self.expires_in / 60:.0f} min.")
+
+
+class MetadataCache:
+    """
+    Persistent cache of API responses, with TTL expiry and LRU eviction.
+
+    Immutable entries (pinned files and versions) never expire.
+    Mutable entries (projects, latest compatible files) expire after the
+    configured TTL. When the cache grows over its size cap, the least
+    recently used entries are evicted first.
+
+    Failed lookups (mods without a compatible file, missing projects) are
+    kept apart for a shorter TTL, so mods that do not support the target
+    config fail instantly on reruns but are checked again soon.
+
+    Any database error or corrupt entry is treated as a cache miss, so a
+    broken cache never breaks a build.
+
+    Every thread keeps one connection per database, and the total size of
+    the entries is kept in memory, so storing a value does not scan the
+    whole table unless the cache is over its size cap.
+    """
+
+    _initialized_paths = set()
+    _init_lock = threading.Lock()
+    _connections = threading.local()
+    _totals = {}
+
+    def __init__(self, path=METADATA_CACHE_PATH, *,
+                 ttl=METADATA_CACHE_TTL,
+                 max_bytes=METADATA_CACHE_MAX_MB * 1024 * 1024,
+                 negative_ttl=NEGATIVE_CACHE_TTL) -> None:
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.negative_ttl = negative_ttl
+
+    @classmethod
+    def from_config(cls, cfg) -> "MetadataCache":
+        """
+        Build a cache using the optional settings of the config file.
+
+        Args:
+            cfg (dict): The config file as a dictionary object.
+
+        Returns:
+            MetadataCache: The cache.
+        """
+        cfg = cfg or {}
+        return cls(ttl=float(cfg.get("cache_ttl", METADATA_CACHE_TTL)),
+                   max_bytes=int(float(cfg.get("cache_max_mb",
+                                               METADATA_CACHE_MAX_MB))
+                                 * 1024 * 1024),
+                   negative_ttl=float(cfg.get("negative_cache_ttl",
+                                              NEGATIVE_CACHE_TTL)))
+
+    @staticmethod
+    def key(endpoint: str, cfg) -> str:
+        """
+        Build the cache key of an endpoint for a target config.
+
+        Args:
+            endpoint (str): The full URL of the endpoint.
+            cfg (dict): The config file as a dictionary object.
+
+        Returns:
+            str: The cache key.
+        """
+        return (f"{endpoint}|{cfg['minecraft_version']}"
+                f"|{cfg['loader'].lower()}")
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Get the connection of this thread to the cache database, creating
+        the database if needed.
+
+        Returns:
+            sqlite3.Connection: The connection. It is shared by every cache
+                object of this thread, so it must not be closed.
+        """
+        with self._init_lock:
+            if self.path not in self._initialized_paths:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with closing(sqlite3.connect(self.path,
+                                             timeout=10)) as connection:
+                    connection.execute("PRAGMA journal_mode=WAL")
+                    connection.executescript(_SCHEMA)
+                    connection.commit()
+                self._initialized_paths.add(self.path)
+
+        connections = getattr(self._connections, "by_path", None)
+        if connections is None:
+            connections = self._connections.by_path = {}
+        if self.path not in connections:
+            connections[self.path] = sqlite3.connect(self.path, timeout=10)
+        return connections[self.path]
+
+    def get(self, key: str):
+        """
+        Get a value from the cache.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            The cached value, or None if missing or expired.
+        """
+        now = time()
+
+        try:
+            with self._connect() as connection:
+                row = connection.execute(
+                    "SELECT value, immutable, created FROM entries "
+                    "WHERE key = ?", (key,)).fetchone()
+
+                if row is None:
+                    return None
+
+                value, immutable, created = row
+                if not immutable and now - created > self.ttl:
+                    connection.execute("DELETE FROM entries WHERE key = ?",
+                                       (key,))
+                    return None
+
+                try:
+                    value = json.loads(value)
+                except ValueError:
+                    connection.execute("DELETE FROM entries WHERE key = ?",
+                                       (key,))
+                    return None
+
+                connection.execute(
+                    "UPDATE entries SET accessed = ? WHERE key = ?",
+                    (now, key))
+
+        except (sqlite3.Error, OSError):
+            return None
+
+        return value
+
+    def put(self, key: str, value, *, immutable=False):
+        """
+        Store a value in the cache, evicting old entries if over the cap.
+
+        Args:
+            key (str): The cache key.
+            value: Any JSON serializable value.
+            immutable (bool): Whether the value can never change upstream.
+        """
+        now = time()
+        value = json.dumps(value, separators=(",", ":"))
+
+        try:
+            with self._connect() as connection:
+                row = connection.execute(
+                    "SELECT size FROM entries WHERE key = ?",
+                    (key,)).fetchone()
+                connection.execute(
+                    "INSERT OR REPLACE INTO entries "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, value, len(value), int(immutable), now, now))
+
+                total = self._add_size(connection,
+                                       len(value) - (row[0] if row else 0))
+                if total > self.max_bytes:
+                    self._evict(connection)
+
+        except (sqlite3.Error, OSError):
+            pass
+
+    def _add_size(self, connection: sqlite3.Connection, delta: int) -> int:
+        """
+        Update the running total size of the entries. The first time in
+        this process it is read from the database instead.
+
+        Args:
+            connection (sqlite3.Connection): An open connection.
+            delta (int): The bytes added, negative if removed.
+
+        Returns:
+            int: The total size of the entries in bytes.
+        """
+        with self._init_lock:
+            if self.path in self._totals:
+                self._totals[self.path] += delta
+            else:
+                self._totals[self.path], = connection.execute(
+                    "SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()
+            return self._totals[self.path]
+
+    def _evict(self, connection: sqlite3.Connection):
+        """
+        Evict the least recently used entries until under the size cap.
+
+        Args:
+            connection (sqlite3.Connection): An open connection.
+        """
+        # Other processes may have changed the table, so start from the
+        # actual total
+        total, = connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()
+
+        if total <= self.max_bytes:
+            with self._init_lock:
+                self._totals[self.path] = total
+            return
+
+        rows = connection.execute(
+            "SELECT key, size FROM entries ORDER BY accessed").fetchall()
+
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_bytes * 0.9:
+                break
+            evicted.append((key,))
+            total -= size
+
+        connection.executemany("DELETE FROM entries WHERE key = ?", evicted)
+        with self._init_lock:
+            self._totals[self.path] = total
+
+    def get_failure(self, provider: str, mod_id, cfg, kind: str):
+        """
+        Get the reason a lookup failed last time, if it is still fresh.
+
+        Args:
+            provider (str): The provider of the mod.
+            mod_id (int or str): The ID of the mod.
+            cfg (dict): The config file as a dictionary object.
+            kind (str): What was looked up, e.g. "file" or "project".
+
+        Returns:
+            str: The error message, or None if not known to fail.
+        """
+        now = time()
+
+        try:
+            with self._connect() as connection:
+                row = connection.execute(
+                    "SELECT reason, created FROM failures "
+                    "WHERE provider = ? AND mod_id = ? "
+                    "AND minecraft_version = ? AND loader = ? AND kind = ?",
+                    _failure_key(provider, mod_id, cfg, kind)).fetchone()
+
+                if row is None:
+                    return None
+
+                reason, created = row
+                if now - created > self.negative_ttl:
+                    connection.execute(
+                        "DELETE FROM failures WHERE created < ?",
+                        (now - self.negative_ttl,))
+                    return None
+
+        except (sqlite3.Error, OSError):
+            return None
+
+        return reason
+
+    def put_failure(self, provider: str, mod_id, cfg, kind: str,
+                    reason: str):
+        """
+        Remember that a lookup failed for the target config.
+
+        Args:
+            provider (str): The provider of the mod.
+            mod_id (int or str): The ID of the mod.
+            cfg (dict): The config file as a dictionary object.
+            kind (str): What was looked up, e.g. "file" or "project".
+            reason (str): The error message.
+        """
+        try:
+            with self._connect() as connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO failures "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (*_failure_key(provider, mod_id, cfg, kind), reason,
+                     time()))
+
+        except (sqlite3.Error, OSError):
+            pass
+
+    def failures(self) -> list[NegativeEntry]:
+        """
+        List the lookups known to fail that have not expired yet.
+
+        Returns:
+            list[NegativeEntry]: The failures, oldest first.
+        """
+        if not os.path.isfile(self.path):
+            return []
+
+        now = time()
+
+        try:
+            rows = self._connect().execute(
+                "SELECT provider, mod_id, minecraft_version, loader, "
+                "kind, reason, created FROM failures "
+                "WHERE created >= ? ORDER BY created",
+                (now - self.negative_ttl,)).fetchall()
+
+        except (sqlite3.Error, OSError):
+            return []
+
+        return [NegativeEntry(*row[:6],
+                              expires_in=row[6] + self.negative_ttl - now)
+                for row in rows]
+
+    def info(self) -> CacheInfo:
+        """
+        Summarize the contents of the cache.
+
+        Returns:
+            CacheInfo: The summary.
+        """
+        info = CacheInfo(path=self.path, max_bytes=self.max_bytes)
+
+        if not os.path.isfile(self.path):
+            return info
+
+        try:
+            connection = self._connect()
+            (info.entries, info.immutable_entries,
+             info.size_bytes) = connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(immutable), 0), "
+                "COALESCE(SUM(size), 0) FROM entries").fetchone()
+            info.failures, = connection.execute(
+                "SELECT COUNT(*) FROM failures WHERE created >= ?",
+                (time() - self.negative_ttl,)).fetchone()
+
+        except (sqlite3.Error, OSError):
+            pass
+
+        return info
+
+    def clear(self):
+        """
+        Delete every entry in the cache.
+        """
+        if not os.path.isfile(self.path):
+            return
+
+        connection = self._connect()
+        with connection:
+            connection.execute("DELETE FROM entries")
+            connection.execute("DELETE FROM failures")
+        with self._init_lock:
+            self._totals[self.path] = 0
+        connection.execute("VACUUM")
+
+
+def _failure_key(provider: str, mod_id, cfg, kind: str) -> tuple:
+    """
+    Build the primary key of a failed lookup.
+
+    Args:
+        provider (str): The provider of the mod.
+        mod_id (int or str): The ID of the mod.
+        cfg (dict): The config file as a dictionary object.
+        kind (str): What was looked up.
+
+    Returns:
+        tuple: The key columns of the failures table.
+    """
+    return (provider, str(mod_id), cfg["minecraft_version"],
+            cfg["loader"].lower(), kind)
@@ -0,0 +1,150 @@
+"""
+Contains the compatibility index of a mod, which maps every minecraft
+version and loader to the newest file of the mod that supports them.
+"""
+
+from dataclasses import dataclass, field
+from time import time
+from typing import Iterable, Union
+
+
+@dataclass
+class CompatibilityIndex:
+    """
+    Map of (minecraft version, loader) to the newest compatible file of a
+    mod, built from its file listing.
+
+    Files are added newest first, as listed by the providers. "scanned"
+    counts the files indexed from the top of the listing, so a partial
+    index can be extended with older pages, and "newest" is the order key
+    of the newest file indexed, so a stale index is refreshed by fetching
+    only the files published after it. Once the whole listing has been
+    seen the index is "complete", and a missing entry means the mod does
+    not support that version and loader.
+
+    Providers that list every file ID of a mod up front keep the IDs known
+    when the index was last refreshed in "file_ids" instead, so only the
+    files missing from it are fetched on the next refresh.
+    """
+
+    entries: dict = field(default_factory=dict)
+    newest: Union[int, str] = None
+    scanned: int = 0
+    complete: bool = False
+    file_ids: list = field(default_factory=list)
+    refreshed: float = field(default_factory=time)
+
+    @staticmethod
+    def cache_key(endpoint: str) -> str:
+        """
+        Build the metadata cache key of the index of a file listing.
+        Unlike other entries, it does not depend on the target config.
+
+        Args:
+            endpoint (str): The full URL of the file listing.
+
+        Returns:
+            str: The cache key.
+        """
+        return f"{endpoint}|index"
+
+    @staticmethod
+    def key(minecraft_version: str, loader: str) -> str:
+        """
+        Build the entry key of a minecraft version and loader.
+
+        Args:
+            minecraft_version (str): The minecraft version.
+            loader (str): The loader name, in any case.
+
+        Returns:
+            str: The entry key.
+        """
+        return f"{minecraft_version}|{loader.lower()}"
+
+    def lookup(self, minecraft_version: str, loader: str):
+        """
+        Get the newest indexed file for a minecraft version and loader.
+
+        Args:
+            minecraft_version (str): The minecraft version.
+            loader (str): The loader name, in any case.
+
+        Returns:
+            The ID of the file, or None if no indexed file supports them.
+        """
+        entry = self.entries.get(self.key(minecraft_version, loader))
+        return None if entry is None else entry[1]
+
+    def put(self, file_id, order, minecraft_version: str, loader: str):
+        """
+        Record a file for a minecraft version and loader, unless a newer
+        one is already recorded.
+
+        Args:
+            file_id (int or str): The ID of the file.
+            order (int or str): A key that grows with the publish date.
+            minecraft_version (str): The minecraft version.
+            loader (str): The loader name, in any case.
+        """
+        key = self.key(minecraft_version, loader)
+        if key not in self.entries or self.entries[key][0] < order:
+            self.entries[key] = [order, file_id]
+
+    def add(self, file_id, order, minecraft_versions: Iterable[str],
+            loaders: Iterable[str]):
+        """
+        Record a file for every minecraft version and loader it supports.
+
+        Args:
+            file_id (int or str): The ID of the file.
+            order (int or str): A key that grows with the publish date.
+            minecraft_versions (Iterable[str]): The supported versions.
+            loaders (Iterable[str]): The supported loaders.
+        """
+        loaders = list(loaders)
+        for minecraft_version in minecraft_versions:
+            for loader in loaders:
+                self.put(file_id, order, minecraft_version, loader)
+
+        if self.newest is None or self.newest < order:
+            self.newest = order
+
+    def is_stale(self, ttl: float) -> bool:
+        """
+        Check if the index should be refreshed.
+
+        Args:
+            ttl (float): The maximum age of the index in seconds.
+
+        Returns:
+            bool: True if it was last refreshed more than ttl seconds ago.
+        """
+        return time() - self.refreshed > ttl
+
+    def to_json(self) -> dict:
+        """
+        Convert the index to a json object, for the metadata cache.
+
+        Returns:
+            dict: The index as a json object.
+        """
+        return {"entries": self.entries,
+                "newest": self.newest,
+                "scanned": self.scanned,
+                "complete": self.complete,
+                "file_ids": self.file_ids,
+                "refreshed": self.refreshed}
+
+    @classmethod
+    def from_json(cls, value: dict) -> "CompatibilityIndex":
+        """
+        Load an index from a json object.
+
+        Args:
+            value (dict): The index as a json object.
+
+        Returns:
+            CompatibilityIndex: The index.
+        """
+        return cls(**value)
@@ -0,0 +1,102 @@
+"""
+Contains helpers to run blocking network calls concurrently with asyncio.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Hashable, Iterable
+
+
+async def gather_bounded(func: Callable[[Any], Any], items: Iterable,
+                         *, limit: int) -> list:
+    """
+    Run a blocking function over many items with bounded concurrency.
+
+    Args:
+        func (Callable): The blocking function to call with each item.
+        items (Iterable): The items to process.
+        limit (int): The maximum number of calls in flight at once.
+
+    Returns:
+        list: The results, in the same order as the items.
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(limit)
+
+    with ThreadPoolExecutor(max_workers=min(limit, len(items))) as executor:
+
+        async def run_one(item):
+            async with semaphore:
+                return await loop.run_in_executor(executor, func, item)
+
+        return await asyncio.gather(*(run_one(item) for item in items))
+
+
+def run_concurrently(func: Callable[[Any], Any], items: Iterable,
+                     *, limit: int) -> list:
+    """
+    Synchronous entry point for gather_bounded.
+
+    Args:
+        func (Callable): The blocking function to call with each item.
+        items (Iterable): The items to process.
+        limit (int): The maximum number of calls in flight at once.
+
+    Returns:
+        list: The results, in the same order as the items.
+    """
+    return asyncio.run(gather_bounded(func, items, limit=limit))
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key, so only the first caller
+    runs the function and the others wait for its result.
+    """
+
+    def __init__(self) -> None:
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        """
+        Call a function, unless a call with the same key is in flight,
+        in which case wait for that one and share its outcome.
+
+        Args:
+            key (Hashable): Identifies the call.
+            func (Callable): The function to call, with no arguments.
+
+        Returns:
+            Any: The result of the function.
+
+        Raises:
+            Exception: Whatever the function raised, in every caller.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {"done": threading.Event()}
+
+        if not leader:
+            call["done"].wait()
+            if "error" in call:
+                raise call["error"]
+            return call["result"]
+
+        try:
+            call["result"] = func()
+            return call["result"]
+        except BaseException as error:
+            call["error"] = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call["done"].set()
@@ -5,20 +5,38 @@ Configuration module for cursely.
 import json
 import os
 import sys
-from time import sleep
 
-import requests
+from .http_client import http_client
+from .retry import retry_policy
 
-DOWNLOAD_RETRIES = 3
+RESOLVE_CONCURRENCY = 64
+DOWNLOAD_CONCURRENCY = 16
+DEF_DOWNLOAD_ORDER = "largest_first"
+PREFETCH_QUEUE_FACTOR = 4
+DEF_INSTALL_MODE = "incremental"
 HOME = os.path.expanduser("~")
 CONFIG_FOLDER = os.path.join(HOME, ".config", "cursely")
 CONFIG_PATH = os.path.join(CONFIG_FOLDER, "config.json")
+CACHE_FOLDER = os.path.join(HOME, ".cache", "cursely")
+METADATA_CACHE_PATH = os.path.join(CACHE_FOLDER, "metadata.sqlite3")
+METADATA_CACHE_TTL = 6 * 60 * 60
+METADATA_CACHE_MAX_MB = 64
+NEGATIVE_CACHE_TTL = 60 * 60
+JAR_STORE_PATH = os.path.join(CACHE_FOLDER, "jars")
+JAR_STORE_MAX_MB = 4096
+PARTIAL_DOWNLOADS_PATH = os.path.join(CACHE_FOLDER, "partial")
+DOWNLOAD_RATE_PATH = os.path.join(CACHE_FOLDER, "download-rate.json")
+DEF_DOWNLOAD_RATE = 2 * 1024 * 1024
+MODS_INDEX_PATH = os.path.join(CACHE_FOLDER, "mods-index.json")
 
 USAGE_INFO = f"""
 Usage:
     cursely [MOD_ID]    Get a brief description of a mod and its download link.
     cursely [KEYWORD]   Search for a mod by its name or author.
     cursely [MODPACK]   Install all listed mods and their dependencies.
+    cursely --cache     Show the contents of the caches.
+    cursely --clear-cache  Delete the caches.
+    cursely --rollback  Restore the mods folder of the previous build.
     cursely --help      Show this help message.
 
 Your configuration (minecraft version, loader, mods path, etc.) is usually
@@ -28,6 +46,26 @@ simply delete the file and run cursely again or edit the file directly.
 If you are running cursely for the first time, you do not need to manually
 create a configuration file. It will ask you to provide the necessary
 information and create the file for you.
+
+Mod metadata is cached in '{METADATA_CACHE_PATH}'.
+Add "cache_ttl" (seconds) or "cache_max_mb" to your configuration to change
+how long project details are kept and how large the cache can grow.
+Mods without a compatible file are remembered for an hour; add
+"negative_cache_ttl" (seconds) to change that.
+
+Downloaded mod files are kept in '{JAR_STORE_PATH}'
+and reused across modpacks. Add "jar_cache_max_mb" to your configuration
+to change how large it can grow.
+
+Up to 16 files are downloaded at once, and at most 8 from each CDN. Add
+"download_concurrency" or "host_download_limits" (an object mapping host
+names to limits) to your configuration to change that. The largest files
+are downloaded first; add "download_order": "in_order" to keep the order
+of the modpack file instead.
+
+Modpacks are installed incrementally: files already in your mods folder are
+kept and only missing or changed ones are downloaded. Add
+"install_mode": "clean" to your configuration to download everything again.
 """
 
 
@@ -79,37 +117,13 @@ def load_config():
             raise ValueError(f"{field} not found in config file.")
 
         # Validity of the values: API_KEY
-        tries = DOWNLOAD_RETRIES
-
-        while True:
-
-            if tries <= 0:
-                raise ValueError("Invalid API_KEY.\n       "
-                                 "If you just created your "
-                                 "account, please wait a few minutes and "
-                                 "try again.")
-
-            end_point = 'https://api.curseforge.com/v1/games/432'
-            headers = {"Accept": "application/json",
-                       "x-api-key": cfg["API_KEY"]}
-
-            try:
-                response = requests.get(end_point, headers=headers, timeout=3)
-                if response.status_code == 200:
-                    break
-                sleep((DOWNLOAD_RETRIES + 1 - tries) / 2)
-                tries -= 1
-                continue
-
-            except requests.RequestException:
-                sleep((DOWNLOAD_RETRIES + 1 - tries) / 2)
-                tries -= 1
-                continue
-
-            except Exception:
-                sleep((DOWNLOAD_RETRIES + 1 - tries) / 2)
-                tries -= 1
-                continue
+        end_point = 'https://api.curseforge.com/v1/games/432'
+        retry_policy().run(
+            lambda: http_client().get(end_point, cfg=cfg).raise_for_status(),
+            message=("Invalid API_KEY.\n       "
+                     "If you just created your "
+                     "account, please wait a few minutes and "
+                     "try again."))
 
         # Mods path
         if not os.path.isdir(cfg["mods_path"].strip()):
@@ -2,19 +2,82 @@
 Contains methods to calculate the dependencies of mods.
 """
 
-from itertools import chain
-from multiprocessing import Pool
+from dataclasses import dataclass, field
 from typing import Union
 
+from .concurrency import run_concurrently
+from .config import RESOLVE_CONCURRENCY
 from .mods import Mod
 
 
-def _dependencies_wrapper(mod: Mod) -> Union[set[Mod], int]:
+@dataclass
+class ResolutionStats:
+    """
+    Statistics of a dependency closure resolution.
+    """
+
+    level_sizes: list[int] = field(default_factory=list)
+    edges: int = 0
+    max_fan_out: int = 0
+    reused: int = 0
+
+    @property
+    def depth(self) -> int:
+        """
+        Get the number of dependency levels below the requested mods.
+
+        Returns:
+            int: The depth of the dependency closure.
+        """
+        return max(len(self.level_sizes) - 1, 0)
+
+    @property
+    def mean_fan_out(self) -> float:
+        """
+        Get the mean number of required dependencies per resolved mod.
+
+        Returns:
+            float: The mean fan-out.
+        """
+        resolved = sum(self.level_sizes)
+        return self.edges / resolved if resolved else 0.0
+
+    def __str__(self) -> str:
+        levels = " + ".join(str(size) for size in self.level_sizes)
+        text = (f"{sum(self.level_sizes)} mods ({levels}), "
+                f"depth {self.depth}, "
+                f"fan-out {self.mean_fan_out:.1f} avg / "
+                f"{self.max_fan_out} max")
+        if self.reused:
+            text += f", {self.reused} reused from the resolution file"
+        return text
+
+
+def mod_key(mod: Mod) -> tuple[str, str]:
+    """
+    Get the key that identifies a mod across providers.
+
+    Mod IDs read from modpack files are strings while the ones returned by
+    the CurseForge API are integers, so they are compared as strings.
+
+    Args:
+        mod (Mod): The mod.
+
+    Returns:
+        tuple: The provider class name and the mod ID.
+    """
+    return type(mod).__name__, str(mod.mod_id)
+
+
+def _dependencies_wrapper(mod: Mod, on_resolved=None) \
+        -> Union[set[Mod], int]:
     """
     Wrapper for the mod_dependencies function.
 
     Args:
         mod (Mod): The mod to get the dependencies for.
+        on_resolved (Callable): Called with the mod once its dependencies,
+            and so its file, are known.
 
     Returns:
         set: The dependencies of the mod. {-1} in case of error.
@@ -22,34 +85,118 @@ def _dependencies_wrapper(mod: Mod) -> Union[set[Mod], int]:
     try:
         dependencies = mod.dependencies
         print("*", end="", flush=True)
-        return dependencies
     except ValueError:
         print("-", end="", flush=True)
         return {-1}
 
+    if on_resolved is not None:
+        on_resolved(mod)
+    return dependencies
+
 
-def calculate_dependencies(mods: list[Mod]) -> set[Mod]:
+def resolve_dependency_closure(mods: list[Mod],
+                               *, limit=RESOLVE_CONCURRENCY, pinned=None,
+                               on_resolved=None) \
+        -> tuple[set[Mod], ResolutionStats]:
     """
-    Calculate the dependencies of a list of mods.
+    Resolve the full transitive dependency closure of a list of mods.
+
+    The closure is expanded one level at a time. Every mod of a level is
+    looked up concurrently and each mod is looked up at most once, no matter
+    how many mods depend on it.
+
+    Pinned mods are used in place of the dependencies they match. When they
+    already know their own dependencies, as the ones read from a resolution
+    file do, they need no lookups at all.
 
     Args:
         mods (list): A list of mods.
+        limit (int): The maximum number of lookups in flight at once.
+        pinned (dict): Resolved mods to reuse, by mod_key().
+        on_resolved (Callable): Called from the lookup threads with every
+            mod whose dependencies, and so its file, are known, while the
+            rest of the closure is still resolving. Must be thread-safe.
 
     Returns:
-        set: The dependencies of the mods.
-                Will catch any errors and print error messages.
+        tuple: The dependencies of the mods, excluding the mods themselves,
+            and the statistics of the resolution.
+
+    Raises:
+        ValueError: If the dependencies of any mod could not be fetched.
     """
-    print("Calculating dependencies...")
-    dependencies = []
+    stats = ResolutionStats()
+    pinned = pinned or {}
+    seen = {}
+    for mod in mods:
+        seen.setdefault(mod_key(mod), mod)
+
+    roots = set(seen)
+    frontier = list(seen.values())
+    stats.reused = sum(pinned.get(key) is mod for key, mod in seen.items())
+    failed = False
+
+    while frontier:
+        stats.level_sizes.append(len(frontier))
+        next_frontier = []
+
+        Mod.hydrate(frontier)
 
-    with Pool() as pool:
-        dependencies.extend(pool.map(_dependencies_wrapper, mods))
+        for dependencies in run_concurrently(
+                lambda mod: _dependencies_wrapper(mod, on_resolved),
+                frontier, limit=limit):
+            if -1 in dependencies:
+                failed = True
+                continue
 
-    print()
+            stats.edges += len(dependencies)
+            stats.max_fan_out = max(stats.max_fan_out, len(dependencies))
 
-    dependencies = set(chain.from_iterable(dependencies))
+            for dependency in dependencies:
+                key = mod_key(dependency)
+                if key not in seen:
+                    if key in pinned:
+                        dependency = pinned[key]
+                        stats.reused += 1
+                    seen[key] = dependency
+                    next_frontier.append(dependency)
 
-    if -1 in dependencies:
+        frontier = next_frontier
+
+    if failed:
         raise ValueError("Failed to get dependencies.")
 
+    dependencies = {mod for key, mod in seen.items() if key not in roots}
+    return dependencies, stats
+
+
+def calculate_dependencies(mods: list[Mod],
+                           *, limit=RESOLVE_CONCURRENCY,
+                           pinned=None, on_resolved=None) -> set[Mod]:
+    """
+    Calculate the dependencies of a list of mods, including the
+    dependencies of their dependencies.
+
+    Lookups run concurrently in this process, so the metadata they fetch
+    stays cached on the given Mod objects.
+
+    Args:
+        mods (list): A list of mods.
+        limit (int): The maximum number of lookups in flight at once.
+        pinned (dict): Resolved mods to reuse, by mod_key().
+        on_resolved (Callable): Called from the lookup threads with every
+            mod whose file is known. Must be thread-safe.
+
+    Returns:
+        set: The dependencies of the mods.
+                Will catch any errors and print error messages.
+    """
+    print("Calculating dependencies...")
+
+    try:
+        dependencies, stats = resolve_dependency_closure(
+            mods, limit=limit, pinned=pinned, on_resolved=on_resolved)
+    finally:
+        print()
+
+    print(f"Resolved {stats}.")
     return dependencies
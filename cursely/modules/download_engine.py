@@ -0,0 +1,386 @@
+"""
+Contains the download engine, which runs downloads in a thread pool with a
+global concurrency limit and a concurrency limit per host.
+"""
+
+import heapq
+import json
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager, suppress
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Any, Callable, Iterable, Union
+from urllib.parse import urlsplit
+
+from .config import (DEF_DOWNLOAD_ORDER, DEF_DOWNLOAD_RATE,
+                     DOWNLOAD_CONCURRENCY, DOWNLOAD_RATE_PATH)
+
+DEFAULT_HOST_LIMIT = 4
+HOST_LIMITS = {"edge.forgecdn.net": 8,
+               "mediafilez.forgecdn.net": 8,
+               "cdn.modrinth.com": 8}
+# Weight of the latest run in the persisted download rate
+RATE_SMOOTHING = 0.5
+# Smaller samples mostly measure latency rather than bandwidth
+MIN_RATE_SAMPLE_BYTES = 1024 * 1024
+
+
+def largest_first(size: int):
+    """
+    Scheduling policy that starts the largest files first, so no large file
+    is left alone at the end of a run (longest processing time first).
+
+    Args:
+        size (int): The size of a file in bytes.
+
+    Returns:
+        int: The sort key of the file.
+    """
+    return -size
+
+
+def in_order(size: int):  # pylint: disable=unused-argument
+    """
+    Scheduling policy that starts files in the order they were given.
+
+    Args:
+        size (int): The size of a file in bytes.
+
+    Returns:
+        int: The sort key of the file.
+    """
+    return 0
+
+
+SCHEDULING_POLICIES = {"largest_first": largest_first,
+                       "in_order": in_order}
+
+
+def size_of(item) -> Union[int, None]:
+    """
+    Get the size a downloadable announces, without looking it up.
+
+    Args:
+        item (Downloadable): The mod or URL.
+
+    Returns:
+        int: The size in bytes, or None if unknown.
+    """
+    with suppress(ValueError, AttributeError):
+        return item.size
+    return None
+
+
+def load_rate(path=DOWNLOAD_RATE_PATH) -> float:
+    """
+    Load the speed of a single download measured in previous runs.
+
+    Args:
+        path (str): The path to the rate file.
+
+    Returns:
+        float: The speed in bytes per second, or the default if unknown.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            rate = float(json.load(file)["rate"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return DEF_DOWNLOAD_RATE
+    return rate if rate > 0 else DEF_DOWNLOAD_RATE
+
+
+def save_rate(rate: float, path=DOWNLOAD_RATE_PATH):
+    """
+    Persist the speed of a single download for the next runs.
+
+    Args:
+        rate (float): The speed in bytes per second.
+        path (str): The path to the rate file.
+    """
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({"rate": rate}, file)
+    except OSError:
+        pass
+
+
+def predict_makespan(sizes: list[int], slots: int, rate: float) -> float:
+    """
+    Predict how long downloading files in a given order takes, starting each
+    one on the first free slot and assuming every download runs at the
+    same rate.
+
+    Args:
+        sizes (list[int]): The sizes of the files in bytes, in start order.
+        slots (int): The number of downloads at once.
+        rate (float): The speed of a single download in bytes per second.
+
+    Returns:
+        float: The predicted time in seconds.
+    """
+    if not sizes or rate <= 0:
+        return 0.0
+
+    finish_times = [0.0] * max(slots, 1)
+    for size in sizes:
+        heapq.heappush(finish_times,
+                       heapq.heappop(finish_times) + size / rate)
+    return max(finish_times)
+
+
+@dataclass
+class ScheduleStats:
+    """
+    Statistics of a download engine run.
+    """
+
+    files: int = 0
+    total_bytes: int = 0
+    predicted: float = 0.0
+    actual: float = 0.0
+
+    def __str__(self) -> str:
+        text = (f"{self.files} files, "
+                f"{self.total_bytes / 1024 / 1024:.1f} MB "
+                f"in {self.actual:.1f} s")
+        if self.predicted > 0:
+            text += f" (predicted {self.predicted:.1f} s)"
+        return text
+
+
+class DownloadEngine:
+    """
+    Runs downloads in threads of this process.
+
+    At most "limit" downloads run at once, and at most the limit of its
+    host for each host, so a slow CDN cannot take every slot. Per-host slots
+    are shared by everything using the same engine.
+
+    Downloads are started in the order given by the scheduling policy,
+    a sort key computed from the size of each file.
+    """
+
+    def __init__(self, *, limit=DOWNLOAD_CONCURRENCY,
+                 host_limits: dict = None,
+                 policy: Callable[[int], Any] = largest_first,
+                 rate: float = DEF_DOWNLOAD_RATE,
+                 rate_path: str = None) -> None:
+        """
+        Initialize a DownloadEngine object.
+
+        Args:
+            limit (int): The maximum number of downloads at once.
+            host_limits (dict): The maximum number of downloads at once by
+                host name, on top of the defaults in HOST_LIMITS.
+            policy (Callable): The scheduling policy. Gets the size of a
+                file in bytes and returns its sort key.
+            rate (float): The expected speed of a single download in bytes
+                per second, used to predict how long a run takes.
+            rate_path (str): Where the measured speed is persisted after
+                every run. Not persisted if None.
+        """
+        self.limit = limit
+        self.host_limits = {**HOST_LIMITS, **(host_limits or {})}
+        self.policy = policy
+        self.rate = rate
+        self.rate_path = rate_path
+        self.last_stats = None
+        self._transferred = 0
+        self._transfer_time = 0.0
+        self._slots = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, cfg) -> "DownloadEngine":
+        """
+        Build an engine using the optional settings of the config file.
+
+        Args:
+            cfg (dict): The config file as a dictionary object.
+
+        Returns:
+            DownloadEngine: The engine.
+
+        Raises:
+            ValueError: If the download order is unknown.
+        """
+        cfg = cfg or {}
+        order = cfg.get("download_order", DEF_DOWNLOAD_ORDER)
+        if order not in SCHEDULING_POLICIES:
+            raise ValueError(f"Unknown download order: {order}")
+
+        return cls(limit=int(cfg.get("download_concurrency",
+                                     DOWNLOAD_CONCURRENCY)),
+                   host_limits={host: int(limit) for host, limit
+                                in cfg.get("host_download_limits",
+                                           {}).items()},
+                   policy=SCHEDULING_POLICIES[order],
+                   rate=load_rate(),
+                   rate_path=DOWNLOAD_RATE_PATH)
+
+    def host_limit(self, host: str) -> int:
+        """
+        Get the maximum number of downloads at once from a host.
+
+        Args:
+            host (str): The host name.
+
+        Returns:
+            int: The limit, never above the global one.
+        """
+        return min(self.host_limits.get(host, DEFAULT_HOST_LIMIT), self.limit)
+
+    def _slot(self, url: str) -> threading.BoundedSemaphore:
+        """
+        Get the semaphore guarding the downloads from the host of a URL.
+
+        Args:
+            url (str): Any URL on the host.
+
+        Returns:
+            threading.BoundedSemaphore: The semaphore of the host.
+        """
+        host = urlsplit(url).hostname or ""
+        with self._lock:
+            if host not in self._slots:
+                self._slots[host] = threading.BoundedSemaphore(
+                    self.host_limit(host))
+            return self._slots[host]
+
+    @contextmanager
+    def host_slot(self, url: str):
+        """
+        Hold one of the download slots of the host of a URL, waiting for
+        one to be free.
+
+        Args:
+            url (str): The URL about to be downloaded.
+        """
+        with self._slot(url):
+            yield
+
+    def schedule(self, items: list) -> list[int]:
+        """
+        Order items by the scheduling policy. Items of unknown size are
+        assumed to have the mean size of the rest.
+
+        Args:
+            items (list): The items to download.
+
+        Returns:
+            list[int]: The indexes of the items, in start order.
+        """
+        sizes = self._sizes(items)
+        return sorted(range(len(items)),
+                      key=lambda index: self.policy(sizes[index]))
+
+    def _sizes(self, items: list) -> list[int]:
+        """
+        Get the sizes of items, filling in unknown ones with the mean.
+
+        Args:
+            items (list): The items to download.
+
+        Returns:
+            list[int]: The sizes in bytes.
+        """
+        sizes = [size_of(item) for item in items]
+        known = [size for size in sizes if size is not None]
+        mean = sum(known) // len(known) if known else 0
+        return [mean if size is None else size for size in sizes]
+
+    def record_transfer(self, size: int, seconds: float):
+        """
+        Record a file downloaded from start to end over the network, to
+        measure the speed of a single download. Files installed from the
+        store or resumed from a partial download must not be recorded.
+        Can be called from several threads at once.
+
+        Args:
+            size (int): The bytes downloaded.
+            seconds (float): The time the download took.
+        """
+        with self._lock:
+            self._transferred += size
+            self._transfer_time += seconds
+
+    def _update_rate(self):
+        """
+        Blend the speed measured since the last update into the expected
+        one, and persist it for the next runs.
+        """
+        with self._lock:
+            transferred, seconds = self._transferred, self._transfer_time
+            self._transferred, self._transfer_time = 0, 0.0
+
+        if transferred < MIN_RATE_SAMPLE_BYTES or seconds <= 0:
+            return
+
+        self.rate = (RATE_SMOOTHING * transferred / seconds
+                     + (1 - RATE_SMOOTHING) * self.rate)
+        if self.rate_path is not None:
+            save_rate(self.rate, self.rate_path)
+
+    def run(self, func: Callable[[Any], Any], items: Iterable,
+            *, url: Callable[[Any], str] = lambda item: item.url,
+            cached: Callable[[Any], bool] = None) -> list:
+        """
+        Call a blocking download function with every item.
+
+        Items are started in the order of the scheduling policy, skipping
+        over the ones whose host has no free slot, so one busy host does not
+        hold back the others. Before starting, the time the run takes is
+        predicted from the expected download speed. The prediction and the
+        time actually taken are kept in last_stats.
+
+        Args:
+            func (Callable): The download function to call with each item.
+            items (Iterable): The items to download.
+            url (Callable): Gets the URL of an item.
+            cached (Callable): Tells if an item needs no download, so it is
+                left out of the prediction.
+
+        Returns:
+            list: The results, in the same order as the items.
+        """
+        items = list(items)
+        results = [None] * len(items)
+        order = self.schedule(items)
+        sizes = self._sizes(items)
+        predicted = predict_makespan(
+            [sizes[index] for index in order
+             if cached is None or not cached(items[index])],
+            self.limit, self.rate)
+
+        pending = [(index, self._slot(url(items[index]))) for index in order]
+        running = {}
+        start = perf_counter()
+
+        with ThreadPoolExecutor(max_workers=max(self.limit, 1)) as executor:
+            while pending or running:
+
+                # Start every item whose host has a free slot. If the slots
+                # are all held elsewhere, wait for the first one
+                for index, slot in list(pending):
+                    if len(running) >= self.limit:
+                        break
+                    if slot.acquire(blocking=not running):
+                        pending.remove((index, slot))
+                        future = executor.submit(func, items[index])
+                        running[future] = index, slot
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, slot = running.pop(future)
+                    slot.release()
+                    results[index] = future.result()
+
+        self.last_stats = ScheduleStats(files=len(items),
+                                        total_bytes=sum(sizes),
+                                        predicted=predicted,
+                                        actual=perf_counter() - start)
+        self._update_rate()
+        return results
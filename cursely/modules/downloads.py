@@ -3,18 +3,27 @@ Contains the download_all function and related helper functions
 to download mods and URLs.
 """
 
+import hashlib
+import json
 import os
+import queue
 import shutil
+import threading
+from contextlib import suppress
 from dataclasses import dataclass
-from itertools import repeat
-from multiprocessing import Pool
-from time import sleep
-from typing import Union
+from time import perf_counter
+from typing import Callable, Union
 
 import requests
 
-from .config import DOWNLOAD_RETRIES
+from .config import PARTIAL_DOWNLOADS_PATH, PREFETCH_QUEUE_FACTOR
+from .download_engine import DownloadEngine, size_of
+from .http_client import http_client
+from .jar_store import HASH_ALGOS, JarStore
 from .mods import Mod
+from .retry import DOWNLOAD_DEADLINE, retry_policy
+
+CHUNK_SIZE = 256 * 1024
 
 
 @dataclass
@@ -45,6 +54,9 @@ class URL:
         self.url = url
         self.name = url.split("/")[-1]
         self.mod_id = mod_id
+        self.hashes = {}
+        self.size = None
+        self.verified_hashes = None
 
     def __str__(self) -> str:
         text = f"{self.url}"
@@ -81,27 +93,34 @@ Downloadable = Union[Mod, URL]
 DownloadResult = Union[Downloadable, DownloadError]
 
 
-def download_all(downloadables: list[Downloadable],
-                 cfg) -> list[DownloadResult]:
+def download_all(downloadables: list[Downloadable], cfg,
+                 *, engine: DownloadEngine = None) -> list[DownloadResult]:
     """
     Download mods or URLs.
 
     Args:
         downloadables (list[Downloadable]): A list of mods or URLs.
         cfg (dict): The config file as a dictionary object.
+        engine (DownloadEngine): The engine to download with. Defaults to
+            one built from the config file.
 
     Returns:
         list[DownloadResult]: A list of mods or URLs or Nones for
             failed downloads.
     """
     print("Downloading mods...")
-    download_results = []
-
-    with Pool() as pool:
-        download_results.extend(pool.starmap(_download_wrapper,
-                                             zip(downloadables,
-                                                 repeat(cfg))))
+    engine = engine or DownloadEngine.from_config(cfg)
+    jar_store = JarStore.from_config(cfg)
+    download_results = engine.run(
+        lambda downloadable: _download_wrapper(downloadable, cfg,
+                                               engine=engine),
+        downloadables,
+        cached=lambda downloadable: jar_store.contains(
+            _hashes_or_none(downloadable) or {}))
     print()
+    print(f"Downloaded {engine.last_stats}.")
+
+    jar_store.evict()
 
     # Clean download results
     hits = [result for result in download_results
@@ -114,7 +133,386 @@ def download_all(downloadables: list[Downloadable],
     return hits + errors
 
 
-def _download_wrapper(downloadable: Downloadable, cfg) -> DownloadResult:
+def file_name(downloadable: Downloadable) -> str:
+    """
+    Get the name a downloadable is saved as in the mods folder.
+
+    Args:
+        downloadable (Downloadable): The mod or URL.
+
+    Returns:
+        str: The file name.
+
+    Raises:
+        ValueError: If the download URL of a mod is unavailable.
+    """
+    return downloadable.url.split("/")[-1]
+
+
+def _hashes_or_none(downloadable: Downloadable) -> Union[dict, None]:
+    """
+    Get the published hashes of a downloadable without failing.
+
+    Args:
+        downloadable (Downloadable): The mod or URL.
+
+    Returns:
+        dict: The hex digests by algorithm name, or None if unknown.
+    """
+    try:
+        return downloadable.hashes
+    except ValueError:
+        return None
+
+
+def _partial_path(url: str) -> str:
+    """
+    Get the path of the partial download of a URL.
+
+    Args:
+        url (str): The URL being downloaded.
+
+    Returns:
+        str: The path to the .part file.
+    """
+    url_hash = hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(PARTIAL_DOWNLOADS_PATH,
+                        f"{url_hash}-{url.split('/')[-1]}.part")
+
+
+def _read_validator(part_path: str):
+    """
+    Read the ETag or Last-Modified value a partial download started with.
+
+    Args:
+        part_path (str): The path to the .part file.
+
+    Returns:
+        str: The validator, or None if unknown.
+    """
+    try:
+        with open(f"{part_path}.json", "r", encoding="utf-8") as file:
+            return json.load(file)["validator"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _write_validator(part_path: str, response):
+    """
+    Save the ETag or Last-Modified value of a response next to its
+    partial download, so it can be resumed later.
+
+    Args:
+        part_path (str): The path to the .part file.
+        response (requests.Response): The response.
+    """
+    validator = (response.headers.get("ETag")
+                 or response.headers.get("Last-Modified"))
+
+    with open(f"{part_path}.json", "w", encoding="utf-8") as file:
+        json.dump({"validator": validator}, file)
+
+
+def _remove_partial(part_path: str):
+    """
+    Delete a partial download and its validator.
+
+    Args:
+        part_path (str): The path to the .part file.
+    """
+    for path in (part_path, f"{part_path}.json"):
+        with suppress(FileNotFoundError):
+            os.remove(path)
+
+
+def _download_partial(url: str, part_path: str, hashes: dict,
+                      *, cancel: threading.Event = None,
+                      on_transfer: Callable[[int, float], None] = None) \
+        -> dict:
+    """
+    Download a URL to a .part file, resuming from the bytes already on
+    disk with a Range request when the server still has the same file.
+    The file is hashed on the fly, reading back only the resumed prefix.
+    Within an operation of the shared retry policy, the download stops
+    once the deadline of the operation has passed.
+
+    Args:
+        url (str): The URL to download.
+        part_path (str): The path to the .part file.
+        hashes (dict): The expected hex digests by algorithm name.
+            Hashes of unsupported algorithms are ignored.
+        cancel (threading.Event): Stops the download when set, keeping
+            the bytes received so far.
+        on_transfer (Callable): Called with the size and the time taken
+            when the whole file was downloaded, not resumed.
+
+    Returns:
+        dict: The hex digests of the complete file by algorithm name.
+            Only the expected ones, or sha512 if none was expected.
+
+    Raises:
+        requests.RequestException: If the connection fails or the server
+            answers with an error. The bytes received so far are kept for
+            the next attempt.
+        ValueError: If the server refuses the request, the download is
+            cancelled, or the complete file does not match the expected
+            hashes. Unless cancelled, the partial download is deleted so
+            the next attempt starts over.
+    """
+    algos = [algo for algo in HASH_ALGOS if hashes.get(algo)] or ["sha512"]
+    hashers = {algo: hashlib.new(algo) for algo in algos}
+
+    # Jars are already compressed, and ranges must refer to the raw bytes
+    headers = {"Accept-Encoding": "identity"}
+
+    offset = 0
+    validator = _read_validator(part_path)
+    if validator and os.path.isfile(part_path):
+        offset = os.path.getsize(part_path)
+
+    # An empty partial download is started over with a plain request
+    if offset > 0:
+        headers.update({"Range": f"bytes={offset}-", "If-Range": validator})
+
+    start = perf_counter()
+    received = 0
+
+    with http_client().get(url, headers=headers, stream=True) as response:
+
+        if response.status_code == 206 and offset > 0:
+            with open(part_path, "rb") as file:
+                while chunk := file.read(min(CHUNK_SIZE, offset)):
+                    offset -= len(chunk)
+                    for hasher in hashers.values():
+                        hasher.update(chunk)
+            mode = "ab"
+
+        elif response.status_code == 200:
+            _write_validator(part_path, response)
+            mode = "wb"
+
+        elif response.status_code == 416:
+            _remove_partial(part_path)
+            raise ValueError("Partial download no longer valid.")
+
+        else:
+            response.raise_for_status()
+            _remove_partial(part_path)
+            raise ValueError(f"Unexpected status {response.status_code}.")
+
+        with open(part_path, mode) as file:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                if cancel is not None and cancel.is_set():
+                    raise ValueError("Download cancelled.")
+                remaining = retry_policy().remaining()
+                if remaining is not None and remaining <= 0:
+                    raise ValueError("Download deadline reached.")
+                file.write(chunk)
+                received += len(chunk)
+                for hasher in hashers.values():
+                    hasher.update(chunk)
+
+    if mode == "wb" and on_transfer is not None:
+        on_transfer(received, perf_counter() - start)
+
+    digests = {algo: hasher.hexdigest() for algo, hasher in hashers.items()}
+
+    if any(hashes.get(algo, digest).lower() != digest
+           for algo, digest in digests.items()):
+        _remove_partial(part_path)
+        raise ValueError(f"Hash mismatch for {url}.")
+
+    return digests
+
+
+class Prefetch:
+    """
+    Downloads mod files into the jar store in background threads, so the
+    network is busy while mods are still being resolved and while the user
+    confirms a build.
+
+    Files are fed in one by one as soon as their download URL is known.
+    The queue between the caller and the download threads is bounded, so
+    put() blocks when the caller gets too far ahead of the downloads, while
+    feed() queues files from a background thread so the caller can go on.
+    Queued files are started in the order of the scheduling policy of the
+    engine.
+
+    Only files with a published hash can be stored, the rest are left for
+    download_all. Prefetched files stay in the store if the build is
+    cancelled, and interrupted downloads are resumed next time.
+    """
+
+    def __init__(self, cfg, *, engine: DownloadEngine = None,
+                 skip: Callable[[Downloadable], bool] = None) -> None:
+        """
+        Initialize a Prefetch object.
+
+        Args:
+            cfg (dict): The config file as a dictionary object.
+            engine (DownloadEngine): The engine whose limits are respected.
+                Defaults to one built from the config file.
+            skip (Callable): Tells if a file is not needed, for example
+                because the mods folder already has it.
+        """
+        self.engine = engine or DownloadEngine.from_config(cfg)
+        limit = self.engine.limit
+        self.jar_store = JarStore.from_config(cfg)
+        self.skip = skip
+        self.queued = 0
+        self.fetched = 0
+
+        self._keys = set()
+        self._queue = queue.PriorityQueue(
+            maxsize=limit * PREFETCH_QUEUE_FACTOR)
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._closed = False
+        self._feeder = None
+        self._threads = [threading.Thread(target=self._run, daemon=True)
+                         for _ in range(limit)]
+
+    def start(self) -> "Prefetch":
+        """
+        Start the download threads.
+
+        Returns:
+            Prefetch: The prefetch itself.
+        """
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def put(self, downloadable: Downloadable):
+        """
+        Queue a file for download, unless it is already stored, queued or
+        not needed. Blocks while the queue is full. Can be called from
+        several threads at once.
+
+        Args:
+            downloadable (Downloadable): The mod or URL to download.
+        """
+        try:
+            key = self.jar_store.key(downloadable.hashes)
+            if key is None or key in self._keys \
+               or self.jar_store.contains(downloadable.hashes) \
+               or (self.skip is not None and self.skip(downloadable)):
+                return
+        except ValueError:
+            return
+
+        with self._lock:
+            if key in self._keys:
+                return
+            self._keys.add(key)
+            self.queued += 1
+            sequence = self.queued
+
+        self._queue.put((0, self.engine.policy(size_of(downloadable) or 0),
+                         sequence, downloadable))
+
+    def feed(self, downloadables: list[Downloadable]):
+        """
+        Queue files from a background thread and close the prefetch once
+        they are all queued. Returns right away, even if the queue is full.
+
+        Args:
+            downloadables (list[Downloadable]): The mods or URLs.
+        """
+        downloadables = list(downloadables)
+
+        def run():
+            for downloadable in downloadables:
+                if self._cancel.is_set():
+                    break
+                self.put(downloadable)
+            self.close()
+
+        self._feeder = threading.Thread(target=run, daemon=True)
+        self._feeder.start()
+
+    @property
+    def busy(self) -> bool:
+        """
+        Check if files are still being queued or were queued at all.
+
+        Returns:
+            bool: True if there may be downloads left to wait for.
+        """
+        return bool(self.queued) \
+            or (self._feeder is not None and self._feeder.is_alive())
+
+    def close(self):
+        """
+        Let the download threads finish once the queue is empty.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+
+        # Sorted after every file, so the queue is drained first
+        for index, _ in enumerate(self._threads):
+            self._queue.put((1, 0, index, None))
+
+    def wait(self) -> int:
+        """
+        Wait for every queued file to be downloaded.
+
+        Returns:
+            int: The number of files downloaded into the store.
+        """
+        if self._feeder is not None:
+            self._feeder.join()
+        self.close()
+        for thread in self._threads:
+            thread.join()
+        return self.fetched
+
+    def cancel(self):
+        """
+        Stop downloading, keeping the files fetched so far.
+        """
+        self._cancel.set()
+        self.wait()
+
+    def _run(self):
+        while (downloadable := self._queue.get()[-1]) is not None:
+            if self._fetch(downloadable):
+                with self._lock:
+                    self.fetched += 1
+
+    def _fetch(self, downloadable: Downloadable) -> bool:
+        """
+        Download a file into the jar store.
+
+        Args:
+            downloadable (Downloadable): The mod or URL to download.
+
+        Returns:
+            bool: True if the file was downloaded and stored.
+        """
+        if self._cancel.is_set():
+            return False
+
+        part_path = _partial_path(downloadable.url)
+        try:
+            os.makedirs(PARTIAL_DOWNLOADS_PATH, exist_ok=True)
+            with self.engine.host_slot(downloadable.url):
+                digests = _download_partial(
+                    downloadable.url, part_path, downloadable.hashes,
+                    cancel=self._cancel,
+                    on_transfer=self.engine.record_transfer)
+        except (requests.RequestException, ValueError, OSError):
+            return False
+
+        stored = self.jar_store.add(part_path, digests, verified=True)
+        _remove_partial(part_path)
+        return stored
+
+
+def _download_wrapper(downloadable: Downloadable, cfg,
+                      *, engine: DownloadEngine = None) -> DownloadResult:
     """
     Wrapper for the mod_download function.
 
@@ -122,58 +520,58 @@ def _download_wrapper(downloadable: Downloadable, cfg) -> DownloadResult:
         downloadable (Mod or str): The mod to download or a URL.
         cfg (dict): The config file as a dictionary object.
                     Needed for the destination path.
-        tries (int): The number of retries if the download fails.
+        engine (DownloadEngine): The engine measuring download speeds.
 
     Returns:
          DownloadResult: The mod or URL if the download was successful,
     """
-    def download(downloadable: Downloadable, cfg, tries=DOWNLOAD_RETRIES):
+    def download(downloadable: Downloadable, cfg):
         """
-        Download a file from a URL.
+        Download a file from a URL, retrying as set by the shared retry
+        policy.
 
         Args:
             downloadable (Downloadable): The object to download.
             cfg (dict): The config file as a dictionary object.
                 Needed for the destination path.
-            tries (int): The number of retries if the download fails.
-                Defaults to .config.DOWNLOAD_RETRIES.
 
         Returns:
             bool: True if the download was successful, raises otherwise.
 
         Raises:
-            ValueError: If the download fails. Tries "tries" times.
+            ValueError: If every try fails or the deadline is reached.
         """
-        while tries > 0:
-
-            try:
-                with requests.get(downloadable.url,
-                                  stream=True, timeout=1) as response:
-
-                    if response.status_code != 200:
-                        sleep((DOWNLOAD_RETRIES + 1 - tries) / 2)
-                        tries -= 1
-                        continue
-
-                    mod_file = os.path.join(cfg["mods_path"],
-                                            downloadable.url.split("/")[-1])
-
-                    with open(mod_file, "wb") as file:
-                        shutil.copyfileobj(response.raw, file)
-
-                    return True
-
-            except requests.RequestException:
-                sleep((DOWNLOAD_RETRIES + 1 - tries) / 2)
-                tries -= 1
-                continue
-
-            except Exception:
-                sleep((DOWNLOAD_RETRIES + 1 - tries) / 2)
-                tries -= 1
-                continue
-
-        raise ValueError("Too many failed downloads.")
+        mod_file = os.path.join(cfg["mods_path"], file_name(downloadable))
+
+        # Reuse the file if it was downloaded before
+        jar_store = JarStore.from_config(cfg)
+        try:
+            hashes = downloadable.hashes
+        except ValueError:
+            hashes = {}
+
+        if jar_store.install(hashes, mod_file):
+            downloadable.verified_hashes = dict([jar_store.key(hashes)])
+            return True
+
+        part_path = _partial_path(downloadable.url)
+        os.makedirs(PARTIAL_DOWNLOADS_PATH, exist_ok=True)
+
+        def attempt():
+            downloadable.verified_hashes = _download_partial(
+                downloadable.url, part_path, hashes,
+                on_transfer=engine and engine.record_transfer)
+
+            # Only complete and verified files are moved into place
+            if jar_store.key(hashes) is not None:
+                jar_store.add(part_path, downloadable.verified_hashes,
+                              verified=True)
+            shutil.move(part_path, mod_file)
+            _remove_partial(part_path)
+
+        retry_policy().run(attempt, deadline=DOWNLOAD_DEADLINE,
+                           message="Too many failed downloads.")
+        return True
 
     try:
         if not isinstance(downloadable, Downloadable):
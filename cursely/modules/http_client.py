@@ -0,0 +1,179 @@
+"""
+Contains the shared HTTP client used for every request made by cursely.
+"""
+
+import os
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .rate_limit import RateLimiter, RateLimitStats
+from .retry import retry_policy
+
+USER_AGENT = "Cursely/0.1.0 (github.com/julynx/cursely)"
+CURSEFORGE_API_HOST = "api.curseforge.com"
+MODRINTH_API_HOST = "api.modrinth.com"
+
+DEFAULT_POOL_SIZE = 8
+HOST_POOL_SIZES = {CURSEFORGE_API_HOST: 64,
+                   MODRINTH_API_HOST: 64,
+                   "edge.forgecdn.net": 16,
+                   "mediafilez.forgecdn.net": 16,
+                   "cdn.modrinth.com": 16}
+
+# Sustained requests per second and burst size. Modrinth allows 300 requests
+# per minute, CurseForge does not publish its limit. The rate limit headers
+# of the responses tighten these further when needed.
+HOST_RATE_LIMITS = {CURSEFORGE_API_HOST: (20, 40),
+                    MODRINTH_API_HOST: (5, 30)}
+THROTTLE_RETRIES = 3
+
+
+class HttpClient:
+    """
+    Process-wide HTTP client keeping one pooled session per host.
+
+    Requests to each host are paced by a shared token bucket, and throttled
+    requests are retried once the server allows it.
+    """
+
+    def __init__(self) -> None:
+        self.limiter = RateLimiter(HOST_RATE_LIMITS)
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def session(self, url: str) -> requests.Session:
+        """
+        Get the keep-alive session for the host of a URL.
+
+        Args:
+            url (str): Any URL on the target host.
+
+        Returns:
+            requests.Session: The pooled session for the host.
+        """
+        host = urlsplit(url).hostname or ""
+
+        with self._lock:
+
+            # Forked workers must not share sockets with their parent
+            if self._pid != os.getpid():
+                self._sessions = {}
+                self.limiter.reset()
+                self._pid = os.getpid()
+
+            if host in self._sessions:
+                return self._sessions[host]
+
+            pool_size = HOST_POOL_SIZES.get(host, DEFAULT_POOL_SIZE)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({"User-Agent": USER_AGENT,
+                                    "Accept-Encoding": "gzip, deflate"})
+
+            self._sessions[host] = session
+            return session
+
+    def request(self, method: str, url: str, *, cfg=None,
+                headers=None, **kwargs) -> requests.Response:
+        """
+        Make a request through the pooled session of the URL's host.
+        Waits for the rate limiter of the host first, and retries up to
+        THROTTLE_RETRIES times if the server answers 429 Too Many Requests.
+        Unless given, the timeouts come from the shared retry policy.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The URL to request.
+            cfg (dict): The config file as a dictionary object.
+                Needed to authenticate against the CurseForge API.
+            headers (dict): Extra headers for this request only.
+            **kwargs: Passed through to requests.Session.request.
+
+        Returns:
+            requests.Response: The response.
+
+        Raises:
+            requests.RequestException: If the request fails.
+        """
+        request_headers = self._default_headers(url, cfg)
+        request_headers.update(headers or {})
+
+        session = self.session(url)
+        bucket = self.limiter.bucket(urlsplit(url).hostname or "")
+        kwargs.setdefault("timeout", retry_policy().timeout(url))
+
+        for tries_left in range(THROTTLE_RETRIES, -1, -1):
+            bucket.acquire()
+            response = session.request(method, url,
+                                       headers=request_headers, **kwargs)
+            bucket.observe(response)
+            retry_policy().observe(response)
+
+            if response.status_code != 429 or tries_left == 0:
+                return response
+            response.close()
+
+        return response
+
+    def rate_limit_stats(self) -> dict[str, RateLimitStats]:
+        """
+        Get how long requests waited on the rate limiter, by host.
+
+        Returns:
+            dict: The statistics by host name.
+        """
+        return self.limiter.stats()
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """
+        Make a GET request. See HttpClient.request.
+        """
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """
+        Make a POST request. See HttpClient.request.
+        """
+        return self.request("POST", url, **kwargs)
+
+    @staticmethod
+    def _default_headers(url: str, cfg) -> dict:
+        """
+        Get the headers sent by default to the host of a URL.
+
+        Args:
+            url (str): The URL to request.
+            cfg (dict): The config file as a dictionary object.
+
+        Returns:
+            dict: The default headers.
+        """
+        host = urlsplit(url).hostname
+
+        if host in {CURSEFORGE_API_HOST, MODRINTH_API_HOST}:
+            headers = {"Accept": "application/json"}
+            if host == CURSEFORGE_API_HOST and cfg is not None:
+                headers["x-api-key"] = cfg["API_KEY"]
+            return headers
+
+        return {}
+
+
+_CLIENT = HttpClient()
+
+
+def http_client() -> HttpClient:
+    """
+    Get the process-wide HTTP client.
+
+    Returns:
+        HttpClient: The shared client.
+    """
+    return _CLIENT
@@ -0,0 +1,248 @@
+"""
+Contains the content-addressed store of downloaded mod files.
+"""
+
+import hashlib
+import os
+import shutil
+import sys
+from contextlib import suppress
+
+from .config import JAR_STORE_MAX_MB, JAR_STORE_PATH
+
+# Stronger hashes are preferred as the store key
+HASH_ALGOS = ("sha512", "sha1")
+FICLONE = 0x40049409
+
+
+def file_hashes(file_path: str, algos) -> dict:
+    """
+    Compute hashes of a file.
+
+    Args:
+        file_path (str): The path to the file.
+        algos (Iterable[str]): The hashlib algorithm names.
+
+    Returns:
+        dict: The hex digests by algorithm name.
+    """
+    hashers = {algo: hashlib.new(algo) for algo in algos}
+
+    with open(file_path, "rb") as file:
+        while chunk := file.read(1024 * 1024):
+            for hasher in hashers.values():
+                hasher.update(chunk)
+
+    return {algo: hasher.hexdigest() for algo, hasher in hashers.items()}
+
+
+def link_or_copy(source: str, destination: str):
+    """
+    Place a file at a destination sharing its data when possible.
+    Tries a hardlink first, then a reflink, then falls back to a copy.
+
+    Args:
+        source (str): The path to the source file.
+        destination (str): The path to the destination file.
+    """
+    with suppress(FileNotFoundError):
+        os.remove(destination)
+
+    try:
+        os.link(source, destination)
+        return
+    except OSError:
+        pass
+
+    if sys.platform == "linux":
+        try:
+            _reflink(source, destination)
+            return
+        except OSError:
+            with suppress(FileNotFoundError):
+                os.remove(destination)
+
+    shutil.copyfile(source, destination)
+
+
+def _reflink(source: str, destination: str):
+    """
+    Clone a file on copy-on-write filesystems (Btrfs, XFS).
+
+    Args:
+        source (str): The path to the source file.
+        destination (str): The path to the destination file.
+
+    Raises:
+        OSError: If the filesystem does not support cloning.
+    """
+    import fcntl  # pylint: disable=import-outside-toplevel
+
+    with open(source, "rb") as src, open(destination, "wb") as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+
+class JarStore:
+    """
+    Content-addressed store of mod files, keyed by the file hash published
+    by CurseForge (sha1) or Modrinth (sha512).
+
+    Files are installed into a mods folder by hardlink, reflink or copy.
+    When the store grows over its size cap, the least recently used files
+    are evicted first.
+    """
+
+    def __init__(self, path=JAR_STORE_PATH, *,
+                 max_bytes=JAR_STORE_MAX_MB * 1024 * 1024) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def from_config(cls, cfg) -> "JarStore":
+        """
+        Build a store using the optional settings of the config file.
+
+        Args:
+            cfg (dict): The config file as a dictionary object.
+
+        Returns:
+            JarStore: The store.
+        """
+        cfg = cfg or {}
+        max_mb = float(cfg.get("jar_cache_max_mb", JAR_STORE_MAX_MB))
+        return cls(max_bytes=int(max_mb * 1024 * 1024))
+
+    @staticmethod
+    def key(hashes: dict):
+        """
+        Pick the hash a file is stored under.
+
+        Args:
+            hashes (dict): The hex digests by algorithm name.
+
+        Returns:
+            tuple: The algorithm name and hex digest, or None if no
+                supported hash is known.
+        """
+        for algo in HASH_ALGOS:
+            if hashes.get(algo):
+                return algo, hashes[algo].lower()
+        return None
+
+    def _path(self, algo: str, digest: str) -> str:
+        return os.path.join(self.path, algo, digest[:2], digest)
+
+    def contains(self, hashes: dict) -> bool:
+        """
+        Check if a file is in the store.
+
+        Args:
+            hashes (dict): The hex digests of the file by algorithm name.
+
+        Returns:
+            bool: True if the file is stored.
+        """
+        key = self.key(hashes)
+        return key is not None and os.path.isfile(self._path(*key))
+
+    def install(self, hashes: dict, destination: str) -> bool:
+        """
+        Install a stored file at a destination.
+
+        Args:
+            hashes (dict): The hex digests of the file by algorithm name.
+            destination (str): The path to install the file at.
+
+        Returns:
+            bool: True if the file was in the store and got installed.
+        """
+        key = self.key(hashes)
+        if key is None:
+            return False
+
+        stored = self._path(*key)
+        try:
+            os.utime(stored)
+            link_or_copy(stored, destination)
+        except OSError:
+            return False
+
+        return True
+
+    def add(self, file_path: str, hashes: dict, *, verified=False) -> bool:
+        """
+        Add a downloaded file to the store if it matches its hashes.
+
+        Args:
+            file_path (str): The path to the downloaded file.
+            hashes (dict): The expected hex digests by algorithm name.
+            verified (bool): The hashes were computed from the file itself,
+                so it does not need to be read again.
+
+        Returns:
+            bool: True if the file matched and was stored.
+        """
+        key = self.key(hashes)
+        if key is None:
+            return False
+
+        algo, digest = key
+        if not verified and file_hashes(file_path, [algo])[algo] != digest:
+            return False
+
+        stored = self._path(algo, digest)
+        tmp_path = f"{stored}.tmp{os.getpid()}"
+
+        try:
+            os.makedirs(os.path.dirname(stored), exist_ok=True)
+            link_or_copy(file_path, tmp_path)
+            os.replace(tmp_path, stored)
+        except OSError:
+            with suppress(OSError):
+                os.remove(tmp_path)
+            return False
+
+        return True
+
+    def size(self) -> int:
+        """
+        Get the total size of the stored files.
+
+        Returns:
+            int: The size in bytes.
+        """
+        return sum(entry[1] for entry in self._entries())
+
+    def evict(self):
+        """
+        Delete the least recently used files until under the size cap.
+        """
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(entry[1] for entry in entries)
+
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            with suppress(OSError):
+                os.remove(path)
+                total -= size
+
+    def clear(self):
+        """
+        Delete every stored file.
+        """
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def _entries(self):
+        """
+        List the stored files.
+
+        Returns:
+            Iterator[tuple]: The path, size and last use time of each file.
+        """
+        for root, _, names in os.walk(self.path):
+            for name in names:
+                path = os.path.join(root, name)
+                with suppress(OSError):
+                    stat = os.stat(path)
+                    yield path, stat.st_size, stat.st_mtime
@@ -2,15 +2,134 @@
 Contains classes and methods to work with lock files.
 """
 
-from dataclasses import dataclass
+import hashlib
+from dataclasses import dataclass, field
+from typing import Union
+from urllib.parse import quote, unquote
 
 from ordered_set_37 import OrderedSet
 
-from .downloads import DownloadError, DownloadResult, URL
+from .downloads import DownloadError, DownloadResult, URL, file_name
+from .jar_store import HASH_ALGOS
 from .modpack_statements import (ModpackStatement, StatementRunError,
                                  StatementRunResult)
 from .mods import Mod
 
+DIGEST_HEADER = "# cursely resolution file sha256:"
+
+
+@dataclass
+class LockEntry:
+    """
+    Represents the download details of a resolved mod, so a lock file can be
+    installed without asking the mod providers for them again.
+    """
+
+    mod_id: str = None
+    provider: str = None
+    file_name: str = None
+    url: str = None
+    size: int = None
+    hashes: dict = field(default_factory=dict)
+    dependencies: list[str] = None
+
+    def __str__(self) -> str:
+        fields = [f"lock {self.mod_id}", f"provider={self.provider}"]
+        if self.size is not None:
+            fields.append(f"size={self.size}")
+        fields.extend(f"{algo}={digest}"
+                      for algo, digest in sorted(self.hashes.items()))
+        if self.dependencies is not None:
+            fields.append(f"deps={','.join(sorted(self.dependencies))}")
+        fields.append(f"file={quote(self.file_name)}")
+        fields.append(f"url={self.url}")
+        return " ".join(fields)
+
+    @classmethod
+    def from_string(cls, lock_line: str) -> "LockEntry":
+        """
+        Parse a lock line.
+
+        Args:
+            lock_line (str): The lock line.
+                Must have the format "lock <mod_id> <key>=<value> ..."
+
+        Returns:
+            LockEntry: The lock entry.
+
+        Raises:
+            ValueError: If the line has no mod ID or download URL.
+        """
+        tokens = lock_line.strip().split()
+        if len(tokens) < 2:
+            raise ValueError(f"Invalid lock line: {lock_line}")
+
+        fields = dict(token.split("=", maxsplit=1)
+                      for token in tokens[2:] if "=" in token)
+        if "url" not in fields:
+            raise ValueError(f"Invalid lock line: {lock_line}")
+
+        return cls(mod_id=tokens[1],
+                   provider=fields.get("provider"),
+                   file_name=unquote(fields.get("file",
+                                                fields["url"].split("/")[-1])),
+                   url=fields["url"],
+                   size=int(fields["size"]) if "size" in fields else None,
+                   hashes={algo: fields[algo] for algo in HASH_ALGOS
+                           if algo in fields},
+                   dependencies=([dep_id for dep_id
+                                  in fields["deps"].split(",") if dep_id]
+                                 if "deps" in fields else None))
+
+    @classmethod
+    def from_mod(cls, mod: Mod) -> Union["LockEntry", None]:
+        """
+        Build the lock entry of a downloaded mod.
+
+        Args:
+            mod (Mod): The mod.
+
+        Returns:
+            LockEntry: The lock entry, or None if its download details
+                are unavailable.
+        """
+        try:
+            # Only the published hashes, so the entry does not depend on
+            # whether the file was downloaded or kept from the mods folder
+            hashes = {algo: digest for algo, digest in mod.hashes.items()
+                      if algo in HASH_ALGOS}
+            dependencies = None
+            if mod._dependencies is not None:
+                dependencies = [str(dependency.mod_id)
+                                for dependency in mod._dependencies]
+            return cls(mod_id=str(mod.mod_id),
+                       provider=mod.PROVIDER,
+                       file_name=file_name(mod),
+                       url=mod.url,
+                       size=mod.size,
+                       hashes=hashes,
+                       dependencies=dependencies)
+        except ValueError:
+            return None
+
+    def apply(self, mod: Mod, name: str = None):
+        """
+        Fill in the download details of a mod, so installing it needs no
+        requests to its provider.
+
+        Args:
+            mod (Mod): The mod.
+            name (str): The name of the mod, if known.
+        """
+        mod._url = self.url
+        mod._hashes = dict(self.hashes)
+        mod._size = self.size
+        if name:
+            mod._name = name
+        if self.dependencies is not None:
+            mod._dependencies = {type(mod).shared(dep_id, mod.cfg)
+                                 for dep_id in self.dependencies}
+
 
 @dataclass
 class LockFile:
@@ -24,9 +143,12 @@ class LockFile:
     resolved_urls: set[URL] = None
     failed_downloads: set[DownloadError] = None
 
+    root_specs: set[str] = None
+
     @classmethod
     def from_results(cls, statement_run_results: list[StatementRunResult],
-                     download_results: list[DownloadResult]) -> "LockFile":
+                     download_results: list[DownloadResult],
+                     *, root_specs: set[str] = None) -> "LockFile":
         """
         Generate a lock file from the results of a modpack build.
 
@@ -35,6 +157,9 @@ class LockFile:
                 statements or errors.
             download_results (list[DownloadResult]): A list of mods or URLs or
                 errors.
+            root_specs (set[str]): The mod lines of the modpack file, see
+                root_spec(), so later changes to it can be resolved
+                incrementally.
 
             Returns:
                 LockFile: The lock file.
@@ -45,6 +170,7 @@ class LockFile:
         lock_file.resolved_mods = set()
         lock_file.resolved_urls = set()
         lock_file.failed_downloads = set()
+        lock_file.root_specs = set(root_specs or ())
 
         for item in statement_run_results:
 
@@ -67,53 +193,151 @@ class LockFile:
 
         return lock_file
 
+    def to_string(self) -> str:
+        """
+        Serialize a lock file in a canonical order, so the same build
+        always produces the same text.
+
+        Statements keep their order in the modpack file, since it is the
+        order they run in. Mods are sorted by provider and ID, URLs by
+        address and failures by description.
+
+        Returns:
+            str: The lock file contents, without the digest header.
+        """
+        sections = []
+
+        if self.root_specs:
+            sections.append([f"root {spec}"
+                             for spec in sorted(self.root_specs)])
+
+        if self.resolved_statements:
+            sections.append([f"{statement}"
+                             for statement in self.resolved_statements])
+
+        if self.resolved_mods:
+            lines = []
+            for mod in sorted(self.resolved_mods, key=_mod_sort_key):
+                lines.append(
+                    f"mod {mod.mod_id} {mod.name} == {mod.version_id}")
+                lock_entry = LockEntry.from_mod(mod)
+                if lock_entry is not None:
+                    lines.append(f"{lock_entry}")
+            sections.append(lines)
+
+        if self.resolved_urls:
+            sections.append([f"download {url}"
+                             for url in sorted(self.resolved_urls,
+                                               key=lambda url: url.url)])
+
+        if self.failed_statements:
+            sections.append(["# Failed statements:"]
+                            + [f"# - {statement}" for statement in
+                               sorted(self.failed_statements, key=str)])
+
+        if self.failed_downloads:
+            sections.append(["# Failed downloads:"]
+                            + [f"# - {error}" for error in
+                               sorted(self.failed_downloads, key=str)])
+
+        return "".join("".join(f"{line}\n" for line in lines) + "\n"
+                       for lines in sections)
+
     def to_disk(self, lock_file_path: str):
         """
-        Save a lock file to a file.
+        Save a lock file to a file, headed by the digest of its contents.
 
         Args:
             lock_file (LockFile): The lock file.
             lock_file_path (str): The path to the lock file.
         """
+        text = self.to_string()
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+
         with open(lock_file_path, "w", encoding='utf-8') as file:
+            file.write(f"{DIGEST_HEADER}{digest}\n\n")
+            file.write(text)
+
+        items = sum(len(items or ()) for items in (
+            self.resolved_statements, self.resolved_mods, self.resolved_urls,
+            self.failed_statements, self.failed_downloads))
+        if items:
+            print("*" * items)
+
+
+def root_spec(mod: Mod) -> str:
+    """
+    Get the text that identifies a mod line of a modpack file, ignoring
+    the mod name, so changes to the modpack file can be detected.
+
+    Args:
+        mod (Mod): The mod, as parsed from the modpack file.
+
+    Returns:
+        str: The mod ID, followed by the requested version if any.
+    """
+    if mod.version_id is None:
+        return str(mod.mod_id)
+    return f"{mod.mod_id} == {mod.version_id}"
+
+
+def lock_file_roots(lock_file_path: str) -> Union[set[str], None]:
+    """
+    Read the mod lines of the modpack file a lock file was resolved from.
+
+    Args:
+        lock_file_path (str): The path to the lock file.
+
+    Returns:
+        set[str]: The root specs of the modpack file, see root_spec(),
+            or None if the lock file does not record them.
+    """
+    with open(lock_file_path, "r", encoding='utf-8') as file:
+        root_specs = {line.strip().split(" ", maxsplit=1)[-1].strip()
+                      for line in file
+                      if line.lstrip().startswith("root ")}
+
+    return root_specs or None
+
+
+def _mod_sort_key(mod: Mod) -> tuple:
+    """
+    Get the key mods are sorted by in a lock file.
+    Numeric IDs are compared as numbers and slugs as text.
+
+    Args:
+        mod (Mod): The mod.
+
+    Returns:
+        tuple: The sort key.
+    """
+    mod_id = str(mod.mod_id)
+    return (mod.PROVIDER or "", not mod_id.isdigit(),
+            int(mod_id) if mod_id.isdigit() else 0, mod_id)
+
+
+def lock_file_digest(lock_file_path: str) -> Union[str, None]:
+    """
+    Read the content digest of a lock file from its first line, without
+    reading the rest of the file. Two lock files with the same digest
+    describe the same build.
+
+    Args:
+        lock_file_path (str): The path to the lock file.
+
+    Returns:
+        str: The digest as "sha256:<hex>", or None if the file has no
+            digest header.
+    """
+    try:
+        with open(lock_file_path, "r", encoding='utf-8') as file:
+            first_line = file.readline().strip()
+    except OSError:
+        return None
 
-            if self.resolved_statements:
-                for statement in self.resolved_statements:
-                    file.write(f"{statement}\n")
-                    print("*", end="", flush=True)
-                file.write("\n")
-
-            if self.resolved_mods:
-                for mod in self.resolved_mods:
-                    file.write(
-                        f"mod {mod.mod_id} {mod.name} == {mod.version_id}\n")
-                    print("*", end="", flush=True)
-                file.write("\n")
-
-            if self.resolved_urls:
-                for url in self.resolved_urls:
-                    file.write(f"download {url}\n")
-                    print("*", end="", flush=True)
-                file.write("\n")
-
-            if self.failed_statements:
-                file.write("# Failed statements:\n")
-                for statement in self.failed_statements:
-                    file.write(f"# - {statement}\n")
-                    print("*", end="", flush=True)
-                file.write("\n")
-
-            if self.failed_downloads:
-                file.write("# Failed downloads:\n")
-                for error in self.failed_downloads:
-                    file.write(f"# - {error}\n")
-                    print("*", end="", flush=True)
-                file.write("\n")
-
-            if any((self.resolved_statements, self.resolved_mods,
-                    self.resolved_urls, self.failed_statements,
-                    self.failed_downloads)):
-                print()
+    if not first_line.startswith(DIGEST_HEADER):
+        return None
+    return f"sha256:{first_line[len(DIGEST_HEADER):]}"
 
 
 def associated_lock_file_path(modpack_file_path: str):
@@ -3,18 +3,24 @@ Contains functions to install a modpack from a modpack file.
 """
 
 import os
+from contextlib import suppress
 from dataclasses import dataclass
 
 from ordered_set_37 import OrderedSet
 
-from .config import CONFIG_PATH
-from .dependencies import calculate_dependencies
-from .downloads import URL, DownloadResult, download_all, DownloadError
-from .files import delete_files_in_folder
-from .lockfile import LockFile, associated_lock_file_path
-from .modpack_statements import (ModpackStatement, StatementRunError,
-                                 run_modpack_statements)
+from .config import CONFIG_PATH, DEF_INSTALL_MODE
+from .dependencies import calculate_dependencies, mod_key
+from .download_engine import DownloadEngine
+from .downloads import (URL, DownloadResult, download_all, DownloadError,
+                        Prefetch, file_name)
+from .http_client import http_client
+from .lockfile import (LockEntry, LockFile, associated_lock_file_path,
+                       lock_file_digest, lock_file_roots, root_spec)
+from .modpack_statements import (ModpackConfig, ModpackStatement,
+                                 StatementRunError, run_modpack_statements)
 from .mods import Mod
+from .mods_folder import FolderIndex, plan_install
+from .staging import StagedInstall
 
 
 def install_modpack(modpack_file_path: str, cfg):
@@ -26,31 +32,72 @@ def install_modpack(modpack_file_path: str, cfg):
         cfg (dict): The config file as a dictionary object.
     """
     using_lock_file = False
+    pinned = {}
+
+    # Parse the modpack file, its mods are resolved later
+    modpack = Modpack.from_file(modpack_file_path, cfg, hydrate=False)
+    root_specs = {root_spec(mod) for mod in modpack.mods}
 
     # Search if there is an associated lock file
     lock_file_path = associated_lock_file_path(modpack_file_path)
+    lock_roots = None
     if os.path.isfile(lock_file_path):
+        lock_roots = lock_file_roots(lock_file_path)
+
+    if lock_roots is not None and lock_roots != root_specs:
+
+        # Keep the pins of unchanged mods and resolve only the rest
+        locked = Modpack.from_file(lock_file_path, cfg)
+        pinned = {mod_key(mod): mod for mod in locked.mods}
+        roots = set()
+        for mod in modpack.mods:
+            if root_spec(mod) in lock_roots and mod_key(mod) in pinned:
+                roots.add(pinned[mod_key(mod)])
+            else:
+                pinned.pop(mod_key(mod), None)
+                roots.add(mod)
+        modpack.mods = roots
+
+        print()
+        print("Updating resolution file:")
+        print(f"{lock_file_path}")
+        print(f"{len(root_specs - lock_roots)} mods added or changed, "
+              f"{len(lock_roots - root_specs)} removed.")
+
+    elif os.path.isfile(lock_file_path):
         modpack_file_path = lock_file_path
         using_lock_file = True
+        modpack = Modpack.from_file(modpack_file_path, cfg)
         print()
         print("Using existing resolution file:")
         print(f"{modpack_file_path}")
         print("Delete it to build from scratch.")
+
     else:
         print()
         print("[!] No resolution file found. Building from scratch.")
 
-    # Process modpack file
-    modpack = Modpack.from_file(modpack_file_path, cfg)
     downloads = modpack.mods | modpack.urls
 
+    # Download files as soon as they are resolved, skipping the ones
+    # already in the mods folder
+    incremental = cfg.get("install_mode", DEF_INSTALL_MODE) == "incremental"
+    folder_index = FolderIndex(cfg["mods_path"]) if incremental else None
+    engine = DownloadEngine.from_config(cfg)
+    prefetch = Prefetch(cfg, engine=engine,
+                        skip=folder_index and folder_index.contains)
+    prefetch.start()
+
     # Calculate dependencies
     if not using_lock_file:
         print()
         try:
-            downloads |= {dep for dep in calculate_dependencies(modpack.mods)
+            downloads |= {dep for dep in calculate_dependencies(
+                              modpack.mods, pinned=pinned,
+                              on_resolved=prefetch.put)
                           if dep not in downloads}
         except ValueError:
+            prefetch.cancel()
             print()
             print(f"[x] Build FAILED for {cfg['minecraft_version']}"
                   f" {cfg['loader']}!")
@@ -61,47 +108,107 @@ def install_modpack(modpack_file_path: str, cfg):
             print()
             return
 
-    # Delete files in mods folder
+    Mod.hydrate(download for download in downloads
+                if isinstance(download, Mod))
+
+    # Only fetch missing or changed files
+    kept_downloads = []
+    if incremental:
+        plan = plan_install(list(downloads), cfg["mods_path"],
+                            index=folder_index)
+        print()
+        print(f"Mods folder: {plan}.")
+        kept_downloads = plan.keep
+        downloads = plan.download
+
+    # Keep downloading while the build is being confirmed
+    prefetch.feed(downloads)
+
+    # Confirm the build
     print()
     print("Ready to build")
     print(f"{modpack_file_path}")
     print(f"over Minecraft {cfg['minecraft_version']} on {cfg['loader']}.")
     print("")
-    print("[!] This will erase your mods folder!")
+    print("[!] This will replace the contents of your mods folder!")
     print("")
     print("Press ENTER to continue, CTRL+C to cancel:")
 
     try:
         input()
-        delete_files_in_folder(cfg["mods_path"])
     except KeyboardInterrupt:
+        prefetch.cancel()
         print("\nBuild cancelled.\n")
         return
 
-    # Run modpack statements
-    if modpack.statements:
-        statement_run_results = run_modpack_statements(modpack.statements)
-        errors = [result for result in statement_run_results
-                  if isinstance(result, StatementRunError)]
+    if prefetch.busy:
+        print("Finishing downloads started in the background...")
+        print(f"{prefetch.wait()} files prefetched.")
+        print()
+
+    # Build in a staging folder, leaving the current one untouched
+    staged_install = StagedInstall(cfg["mods_path"])
+    staged_install.prepare(keep=[file_name(download)
+                                 for download in kept_downloads])
+    staging_cfg = {**cfg, "mods_path": staged_install.staging_mods_path}
+
+    try:
+
+        # Run modpack statements
+        statement_run_results = []
+        if modpack.statements:
+            for statement in modpack.statements:
+                if isinstance(statement, ModpackConfig):
+                    statement.install_path = staged_install.overlay_path
+
+            statement_run_results = run_modpack_statements(
+                modpack.statements)
+            errors = [result for result in statement_run_results
+                      if isinstance(result, StatementRunError)]
+
+            print()
+            if errors:
+                print("[!] The following statements failed:")
+                for error in errors:
+                    print(f"    - {error}")
+                print()
+                print(f"[x] Build FAILED for {cfg['minecraft_version']}"
+                      f" {cfg['loader']}!")
+                print("Your mods folder was not changed.")
+                print()
+                staged_install.discard()
+                return
+
+        # Download mods, dependencies and URLs
+        download_results: list[DownloadResult] = \
+            kept_downloads + download_all(downloads, staging_cfg,
+                                           engine=engine)
+        errors = [result for result in download_results
+                  if isinstance(result, DownloadError)]
 
         print()
         if errors:
-            print("[!] The following statements failed:")
+            print("[!] The following downloads failed:")
             for error in errors:
                 print(f"    - {error}")
             print()
 
-    # Download mods, dependencies and URLs
-    download_results: list[DownloadResult] = download_all(downloads, cfg)
-    errors = [result for result in download_results
-              if isinstance(result, DownloadError)]
+    except BaseException:
+        staged_install.discard()
+        raise
 
-    print()
-    if errors:
-        print("[!] The following downloads failed:")
-        for error in errors:
-            print(f"    - {error}")
+    # Swap the new build in
+    try:
+        staged_install.commit()
+    except ValueError as exc:
+        print(f"[x] Build FAILED for {cfg['minecraft_version']}"
+              f" {cfg['loader']}!")
+        print(f"{exc}")
+        print("Run 'cursely --rollback' if your mods folder was changed.")
         print()
+        return
+    print("Previous mods folder kept. Run 'cursely --rollback' to restore it.")
+    print()
 
     # Generate and save lock file
     if not using_lock_file:
@@ -109,15 +216,21 @@ def install_modpack(modpack_file_path: str, cfg):
         print("Saving resolved versions...")
 
         lock_file = LockFile.from_results(
-            statement_run_results, download_results)
+            statement_run_results, download_results, root_specs=root_specs)
         lock_file_path = associated_lock_file_path(modpack_file_path)
         lock_file.to_disk(lock_file_path)
 
         print()
         print("Resolved versions saved to resolution file:")
         print(f"{lock_file_path}")
+        print(f"Digest: {lock_file_digest(lock_file_path)}")
         print()
 
+    # Time lost to rate limits
+    for host, stats in http_client().rate_limit_stats().items():
+        if stats.delayed or stats.throttled:
+            print(f"Rate limited by {host}: {stats}.")
+
     # Build finished
     print("Build finished.\n")
 
@@ -140,13 +253,15 @@ class Modpack:
         return text
 
     @classmethod
-    def from_file(cls, modpack_file_path: str, cfg):
+    def from_file(cls, modpack_file_path: str, cfg, *, hydrate=True):
         """
         Load a modpack file.
 
         Args:
             modpack_file_path (str): Path to the modpack file.
             cfg (dict): The config file as a dictionary object.
+            hydrate (bool): Fetch the details of the mods right away.
+                Otherwise they are only parsed.
 
         Returns:
             ModpackFile: The modpack file.
@@ -155,7 +270,7 @@ class Modpack:
         with open(modpack_file_path, "r", encoding='utf-8') as file:
             file_lines = file.readlines()
 
-        return cls(
+        modpack = cls(
             statements=OrderedSet([
                 ModpackStatement.from_string(
                     modpack_statement_line=line.strip(),
@@ -173,3 +288,24 @@ class Modpack:
                 URL.from_string(modpack_url_line=line.strip())
                 for line in file_lines
                 if line.lstrip().startswith("download ")})
+
+        # Pinned download details from a resolution file
+        mods_by_id = {str(mod.mod_id): mod for mod in modpack.mods}
+        mod_names = {}
+        for line in file_lines:
+
+            if line.lstrip().startswith("mod "):
+                fields = line.split("==", maxsplit=1)[0].split(maxsplit=2)
+                if len(fields) == 3:
+                    mod_names[fields[1]] = fields[2].strip()
+
+            elif line.lstrip().startswith("lock "):
+                with suppress(ValueError):
+                    lock_entry = LockEntry.from_string(line)
+                    if lock_entry.mod_id in mods_by_id:
+                        lock_entry.apply(mods_by_id[lock_entry.mod_id],
+                                         mod_names.get(lock_entry.mod_id))
+
+        if hydrate:
+            Mod.hydrate(modpack.mods)
+        return modpack
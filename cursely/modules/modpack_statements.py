@@ -125,6 +125,7 @@ class ModpackConfig(ModpackStatement):
             modpack_dir,
             modpack_config_path)
         self.app_config = app_config
+        self.install_path = None
 
     def run(self):
 
@@ -133,7 +134,10 @@ class ModpackConfig(ModpackStatement):
             tmp_dir = "C:\\tmp\\cursely"
 
         # Get the minecraft installation path from app_config["mods_path"]
+        # unless the config is being staged somewhere else
         mc_install_path = Path(self.app_config["mods_path"]).parent
+        if self.install_path is not None:
+            mc_install_path = Path(self.install_path)
         if not mc_install_path.is_dir():
             raise ValueError("Invalid 'mods_path'.")
 
@@ -2,16 +2,128 @@
 Contains classes for mods from curseforge.com and modrinth.com.
 """
 
+import json
 import os
+import re
 import sys
-from time import sleep
+import threading
+from contextlib import suppress
+from time import time
 from typing import Union
 
-from numerize.numerize import numerize
 import requests
+from numerize.numerize import numerize
 from prettytable import SINGLE_BORDER, PrettyTable
 
-from .config import DOWNLOAD_RETRIES
+from .cache import MetadataCache
+from .compat_index import CompatibilityIndex
+from .concurrency import SingleFlight, run_concurrently
+from .http_client import http_client
+from .retry import retry_policy
+
+# https://docs.curseforge.com/rest-api/#tocS_ModLoaderType
+CURSEFORGE_LOADER_TYPES = {"forge": 1, "fabric": 4, "quilt": 5, "neoforge": 6}
+# https://docs.curseforge.com/rest-api/#tocS_HashAlgo
+CURSEFORGE_HASH_ALGOS = {1: "sha1", 2: "md5"}
+# https://docs.modrinth.com/api/operations/getproject/
+MODRINTH_SLUG = re.compile(r"[\w!@$()`.+,\"\-']{3,64}")
+FILE_PAGES_IN_FLIGHT = 8
+BULK_CHUNK_SIZE = 100
+
+# Shared Mod objects by (provider, mod ID, version, minecraft version, loader)
+_IDENTITY_MAP = {}
+_IDENTITY_LOCK = threading.Lock()
+
+# Metadata lookups in flight, by cache key
+_LOOKUPS = SingleFlight()
+
+
+# Latest compatible Modrinth versions found during this run, by
+# (project, loader, minecraft version)
+_LATEST_VERSIONS = {}
+
+
+def _first_json_item(text: str):
+    """
+    Decode only the first item of a json array.
+
+    Args:
+        text (str): The json array.
+
+    Returns:
+        The first item, or None if the array is empty.
+
+    Raises:
+        ValueError: If the text is not a json array.
+    """
+    text = text.lstrip()
+    if not text.startswith("["):
+        raise ValueError("Expected a json array.")
+
+    text = text[1:].lstrip()
+    if text.startswith("]"):
+        return None
+
+    item, _ = json.JSONDecoder().raw_decode(text)
+    return item
+
+
+def _chunks(items: list, size: int):
+    """
+    Split a list in chunks.
+
+    Args:
+        items (list): The list to split.
+        size (int): The maximum size of each chunk.
+
+    Returns:
+        Iterator[list]: The chunks.
+    """
+    return (items[i:i + size] for i in range(0, len(items), size))
+
+
+class IncompatibleModError(ValueError):
+    """
+    Raised when a mod has no file for the target minecraft version and
+    loader.
+    """
+
+
+class ModNotFoundError(ValueError):
+    """
+    Raised when the provider of a mod does not know its ID.
+    """
+
+
+def _is_not_found(error: Exception) -> bool:
+    """
+    Check if a failed request was answered with 404 Not Found.
+
+    Args:
+        error (Exception): The error raised by the request.
+
+    Returns:
+        bool: True if the server does not know the resource.
+    """
+    cause = error.__cause__
+    return isinstance(cause, requests.HTTPError) \
+        and cause.response is not None \
+        and cause.response.status_code == 404
+
+
+def _is_project_id(mod_id) -> bool:
+    """
+    Check if a mod ID can be a project ID or slug, rather than a search
+    term that was tried as one.
+
+    Args:
+        mod_id (int or str): The ID of the mod.
+
+    Returns:
+        bool: True for numeric IDs and valid Modrinth IDs or slugs.
+    """
+    mod_id = str(mod_id)
+    return mod_id.isdigit() or MODRINTH_SLUG.fullmatch(mod_id) is not None
 
 
 class Mod:
@@ -28,6 +140,188 @@ class Mod:
 
     mod_id: Union[int, str] = None
     version_id: str = None
+    verified_hashes: dict = None
+    cfg: dict = None
+    BASE_URL: str = None
+    PROVIDER: str = None
+
+    def _make_request(self, url_path, params=None):
+        """
+        Make a request to the API of the mod's provider.
+
+        Args:
+            url_path (str): The url path to the resource.
+            params (dict): The query parameters of the request.
+
+        Returns:
+            The response as a json object.
+
+        Raises:
+            ValueError: If the request fails.
+        """
+        raise NotImplementedError
+
+    def _cache_get(self, url_path):
+        """
+        Get the cached value of an endpoint of the mod's provider.
+
+        Args:
+            url_path (str): The url path to the resource.
+
+        Returns:
+            The cached value, or None on a miss.
+        """
+        cache = MetadataCache.from_config(self.cfg)
+        return cache.get(cache.key(f"{self.BASE_URL}{url_path}", self.cfg))
+
+    def _cache_put(self, url_path, value, *, immutable=False):
+        """
+        Store the value of an endpoint of the mod's provider in the cache.
+
+        Args:
+            url_path (str): The url path to the resource.
+            value: The value to store.
+            immutable (bool): Whether the value can never change.
+        """
+        cache = MetadataCache.from_config(self.cfg)
+        cache.put(cache.key(f"{self.BASE_URL}{url_path}", self.cfg), value,
+                  immutable=immutable)
+
+    def _cached_request(self, url_path, *, immutable=False):
+        """
+        Make a request through the persistent metadata cache.
+
+        Args:
+            url_path (str): The url path to the resource.
+            immutable (bool): Whether the resource can never change.
+
+        Returns:
+            The response as a json object.
+
+        Raises:
+            ValueError: If the request fails.
+        """
+        return self._cached_value(url_path,
+                                  lambda: self._make_request(url_path),
+                                  immutable=immutable)
+
+    def _cached_value(self, url_path, compute, *, immutable=False):
+        """
+        Get a value derived from an endpoint through the metadata cache.
+
+        Args:
+            url_path (str): The url path the value is derived from.
+            compute (Callable): Computes the value on a cache miss.
+            immutable (bool): Whether the value can never change.
+
+        Returns:
+            The cached or computed value.
+
+        Raises:
+            ValueError: If the value cannot be computed.
+        """
+        def lookup():
+            value = self._cache_get(url_path)
+            if value is not None:
+                return value
+
+            value = compute()
+            self._cache_put(url_path, value, immutable=immutable)
+            return value
+
+        # Concurrent lookups of the same resource share one request
+        return _LOOKUPS.do(MetadataCache.key(f"{self.BASE_URL}{url_path}",
+                                             self.cfg), lookup)
+
+    def _index_get(self, url_path):
+        """
+        Get the compatibility index of a listing of the mod's provider.
+
+        Args:
+            url_path (str): The url path to the listing.
+
+        Returns:
+            CompatibilityIndex: The cached index, or None on a miss.
+        """
+        cache = MetadataCache.from_config(self.cfg)
+        value = cache.get(CompatibilityIndex.cache_key(
+            f"{self.BASE_URL}{url_path}"))
+        if value is None:
+            return None
+
+        try:
+            return CompatibilityIndex.from_json(value)
+        except TypeError:
+            return None
+
+    def _index_put(self, url_path, index):
+        """
+        Store the compatibility index of a listing in the cache. It never
+        expires, as it is refreshed in place.
+
+        Args:
+            url_path (str): The url path to the listing.
+            index (CompatibilityIndex): The index.
+        """
+        cache = MetadataCache.from_config(self.cfg)
+        cache.put(CompatibilityIndex.cache_key(f"{self.BASE_URL}{url_path}"),
+                  index.to_json(), immutable=True)
+
+    def _negative_cached(self, kind, error_type, compute):
+        """
+        Compute a value, failing right away if the same lookup failed
+        recently for the target config.
+
+        Args:
+            kind (str): What is looked up, e.g. "file" or "project".
+            error_type (type): The error that is remembered.
+            compute (Callable): Computes the value.
+
+        Returns:
+            The computed value.
+
+        Raises:
+            ValueError: If the value cannot be computed.
+        """
+        cache = MetadataCache.from_config(self.cfg)
+        reason = cache.get_failure(self.PROVIDER, self.mod_id, self.cfg, kind)
+        if reason is not None:
+            raise error_type(reason)
+
+        try:
+            return compute()
+        except error_type as error:
+            cache.put_failure(self.PROVIDER, self.mod_id, self.cfg, kind,
+                              str(error))
+            raise
+
+    def _cached_project(self, url_path):
+        """
+        Get the project record of a mod through the metadata cache,
+        remembering projects the provider does not know. Search terms
+        tried as IDs are not remembered.
+
+        Args:
+            url_path (str): The url path to the project.
+
+        Returns:
+            dict: The project as a json object.
+
+        Raises:
+            ModNotFoundError: If the project does not exist.
+            ValueError: If the request fails.
+        """
+        def project():
+            try:
+                return self._cached_request(url_path)
+            except ValueError as error:
+                if _is_not_found(error):
+                    raise ModNotFoundError("Project not found.") from error
+                raise
+
+        if not _is_project_id(self.mod_id):
+            return project()
+        return self._negative_cached("project", ModNotFoundError, project)
 
     @property
     def name(self):
@@ -119,6 +413,52 @@ class Mod:
         """
         raise NotImplementedError
 
+    @property
+    def hashes(self):
+        """
+        Get the hashes of the file of a mod, as published by its provider.
+
+        Returns:
+            dict: The hex digests by algorithm name. {"sha1": "..."}
+        """
+        raise NotImplementedError
+
+    @property
+    def size(self):
+        """
+        Get the size of the file of a mod, as published by its provider.
+
+        Returns:
+            int: The size in bytes.
+        """
+        raise NotImplementedError
+
+    @classmethod
+    def shared(cls, mod_id, cfg, *, version_id=None) -> "Mod":
+        """
+        Get the shared object of a mod, creating it on first use.
+
+        Every mod listed as a dependency by many others is then looked up
+        once, and what is learned about it is reused by every dependent.
+
+        Args:
+            mod_id (int or str): The ID of the mod.
+            cfg (dict): The config file as a dictionary object.
+            version_id (str): The pinned version of the mod, if any.
+
+        Returns:
+            Mod: The mod object shared by every caller with the same
+                provider, mod ID, version and target config.
+        """
+        key = (cls.PROVIDER, str(mod_id),
+               None if version_id is None else str(version_id),
+               cfg.get("minecraft_version"), cfg.get("loader"))
+
+        with _IDENTITY_LOCK:
+            if key not in _IDENTITY_MAP:
+                _IDENTITY_MAP[key] = cls(mod_id, cfg, version_id=version_id)
+            return _IDENTITY_MAP[key]
+
     @staticmethod
     def factory(mod_id, *, cfg, version_id=None):
         """
@@ -134,9 +474,9 @@ class Mod:
         """
         try:
             int(mod_id)
-            return CurseforgeMod(mod_id, cfg, version_id=version_id)
+            return CurseforgeMod.shared(mod_id, cfg, version_id=version_id)
         except (ValueError, TypeError):
-            return ModrinthMod(mod_id, cfg, version_id=version_id)
+            return ModrinthMod.shared(mod_id, cfg, version_id=version_id)
 
     @classmethod
     def from_string(cls, modpack_mod_line: str, *, cfg) -> "Mod":
@@ -158,12 +498,32 @@ class Mod:
 
         return cls.factory(mod_id, cfg=cfg, version_id=version_id)
 
+    @staticmethod
+    def hydrate(mods):
+        """
+        Fill in the metadata of many mods at once through the bulk
+        endpoints of their providers, instead of one request per mod.
+
+        Mods that fail to load are left untouched, so their properties
+        fall back to regular requests.
+
+        Args:
+            mods (Iterable[Mod]): The mods to fill in.
+        """
+        # Mods pinned by a resolution file already know their download
+        mods = [mod for mod in mods if mod._url is None]
+        CurseforgeMod.hydrate_many([mod for mod in mods
+                                    if isinstance(mod, CurseforgeMod)])
+        ModrinthMod.hydrate_many([mod for mod in mods
+                                  if isinstance(mod, ModrinthMod)])
+
 
 class CurseforgeMod(Mod):
     """
     A class to represent a mod from curseforge.com.
     """
     BASE_URL = "https://api.curseforge.com/v1"
+    PROVIDER = "curseforge"
 
     def __init__(self, mod_id, cfg, *, version_id=None):
         """
@@ -195,6 +555,8 @@ class CurseforgeMod(Mod):
         self._website = None
         self._summary = None
         self._url = None
+        self._hashes = None
+        self._size = None
 
     def __eq__(self, __value: object) -> bool:
         """
@@ -231,13 +593,17 @@ class CurseforgeMod(Mod):
         """
         return hash(self.mod_id)
 
-    def _make_request(self, url_path, tries=DOWNLOAD_RETRIES):
+    def _make_request(self, url_path, params=None,
+                      *, method="GET", body=None):
         """
-        Make a request to the curseforge API.
+        Make a request to the curseforge API, retrying as set by the
+        shared retry policy.
 
         Args:
             url_path (str): The url path to the resource.
-            tries (int): The number of tries left.
+            params (dict): The query parameters of the request.
+            method (str): The HTTP method.
+            body (dict): The json body of the request, if any.
 
         Returns:
             dict: The response as a json object.
@@ -245,25 +611,106 @@ class CurseforgeMod(Mod):
         Raises:
             ValueError: If the request fails.
         """
-        while tries > 0:
+        end_point = f"{self.BASE_URL}{url_path}"
+
+        def request():
+            response = http_client().request(method, end_point,
+                                             cfg=self.cfg,
+                                             params=params,
+                                             json=body)
+            response.raise_for_status()
+            return response.json()["data"]
+
+        return retry_policy().run(request)
+
+    @classmethod
+    def hydrate_many(cls, mods):
+        """
+        Fill in the mod and file of many mods through the bulk endpoints
+        POST /v1/mods and POST /v1/mods/files, in chunks.
+
+        Mods without a pinned version get the newest file listed for the
+        target config in the latestFilesIndexes of their mod record.
 
-            end_point = f"{self.BASE_URL}{url_path}"
-            headers = {"Accept": "application/json",
-                       "x-api-key": self.cfg["API_KEY"]}
+        Args:
+            mods (Iterable[CurseforgeMod]): The mods to fill in.
+        """
+        mods = [mod for mod in mods if mod._mod is None or mod._file is None]
+        if not mods:
+            return
 
+        cfg = mods[0].cfg
+
+        # Mod records, from the cache or in bulk
+        pending = {}
+        for mod in mods:
+            if mod._mod is None:
+                mod._mod = mod._cache_get(f"/mods/{mod.mod_id}")
+            if mod._mod is None:
+                pending.setdefault(str(mod.mod_id), []).append(mod)
+
+        for chunk in _chunks(list(pending), BULK_CHUNK_SIZE):
+            try:
+                records = mods[0]._make_request(
+                    "/mods", method="POST",
+                    body={"modIds": [int(mod_id) for mod_id in chunk],
+                          "filterPcOnly": True})
+            except ValueError:
+                continue
+
+            for record in records:
+                for mod in pending.get(str(record["id"]), []):
+                    mod._mod = record
+                    mod._cache_put(f"/mods/{mod.mod_id}", record)
+
+        # File records, from the cache or in bulk
+        loader_type = CURSEFORGE_LOADER_TYPES.get(cfg["loader"].lower())
+        pending = {}
+        for mod in mods:
+            if mod._file is not None:
+                continue
+
+            file_id = None
+            if mod.version_id is not None:
+                mod._file = mod._cache_get(
+                    f"/mods/{mod.mod_id}/files/{mod.version_id}")
+                file_id = mod.version_id
+            else:
+                mod._file = mod._cache_get(f"/mods/{mod.mod_id}/files")
+                if mod._file is not None:
+                    mod.version_id = mod._file["id"]
+                elif mod._mod is not None:
+                    file_id = max((index["fileId"] for index
+                                   in mod._mod.get("latestFilesIndexes", [])
+                                   if index["gameVersion"]
+                                   == cfg["minecraft_version"]
+                                   and index.get("modLoader") == loader_type),
+                                  default=None)
+
+            if mod._file is None and file_id is not None:
+                pending.setdefault(int(file_id), []).append(mod)
+
+        compatible_config = {cfg["minecraft_version"], cfg["loader"]}
+        for chunk in _chunks(list(pending), BULK_CHUNK_SIZE):
             try:
-                response = requests.get(end_point, headers=headers, timeout=1)
-                return response.json()["data"]
+                records = mods[0]._make_request(
+                    "/mods/files", method="POST", body={"fileIds": chunk})
+            except ValueError:
+                continue
 
-            except requests.RequestException:
-                sleep((DOWNLOAD_RETRIES + 1 - tries) / 2)
-                tries -= 1
+            for record in records:
+                for mod in pending.get(int(record["id"]), []):
 
-            except Exception:
-                sleep((DOWNLOAD_RETRIES + 1 - tries) / 2)
-                tries -= 1
+                    if mod.version_id is not None:
+                        mod._file = record
+                        mod._cache_put(
+                            f"/mods/{mod.mod_id}/files/{mod.version_id}",
+                            record, immutable=True)
 
-        raise ValueError("Too many failed requests.")
+                    elif compatible_config <= set(record["gameVersions"]):
+                        mod._file = record
+                        mod.version_id = record["id"]
+                        mod._cache_put(f"/mods/{mod.mod_id}/files", record)
 
     @property
     def name(self):
@@ -297,7 +744,7 @@ class CurseforgeMod(Mod):
             return self._mod
 
         url_path = f"/mods/{self.mod_id}"
-        self._mod = self._make_request(url_path)
+        self._mod = self._cached_project(url_path)
         return self._mod
 
     @property
@@ -349,12 +796,14 @@ class CurseforgeMod(Mod):
             is found.
         """
 
-        def files(mod_id, index=0):
+        def files(mod_id, index=0, *, filtered=False):
             """
             Get a list of files for a mod. Paginated with page size 50.
 
             Args:
                 index (int): The index of the first file to be returned.
+                filtered (bool): Let the API filter the files by the
+                    minecraft version and loader of the given config.
 
             returns:
                 A list of files.
@@ -362,8 +811,14 @@ class CurseforgeMod(Mod):
             Raises:
                 ValueError: If the request fails.
             """
-            url_path = f"/mods/{mod_id}/files?index={index}&pageSize=50"
-            response = self._make_request(url_path)
+            params = {"index": index, "pageSize": page_size}
+            if filtered:
+                loader = self.cfg["loader"].lower()
+                params["gameVersion"] = self.cfg["minecraft_version"]
+                params["modLoaderType"] = CURSEFORGE_LOADER_TYPES[loader]
+
+            url_path = f"/mods/{mod_id}/files"
+            response = self._make_request(url_path, params=params)
             return response
 
         def get_file_with_version(mod_id, version):
@@ -382,34 +837,201 @@ class CurseforgeMod(Mod):
             """
             # GET /v1/mods/{modId}/files/{fileId}
             url_path = f"/mods/{mod_id}/files/{version}"
-            response = self._make_request(url_path)
+            response = self._cached_request(url_path, immutable=True)
             return response
 
         if self._file is not None:
             return self._file
 
+        page_size = 50
         compatible_config = {self.cfg["minecraft_version"],
                              self.cfg["loader"]}
 
-        # If no version is specified, get the latest compatible file
-        if self.version_id is None:
-            max_results = 5000
-            page_size = 50
-            for i in range(0, max_results, page_size):
-                try:
-                    response = files(self.mod_id, index=i)
-                    if not response:
-                        break
-                except ValueError:
+        def first_compatible(response):
+            """
+            Get the first file of a page that is compatible with the config.
+
+            Args:
+                response (list): A page of files.
+
+            Returns:
+                dict: The file as a json object, or None.
+            """
+            return next((file for file in response
+                         if compatible_config <= set(file["gameVersions"])),
+                        None)
+
+        max_results = 5000
+
+        def page_or_none(index):
+            try:
+                return files(self.mod_id, index=index)
+            except ValueError:
+                return None
+
+        def index_file(index, file):
+            """
+            Add a file to the compatibility index of the mod.
+
+            Args:
+                index (CompatibilityIndex): The index.
+                file (dict): The file as a json object.
+            """
+            game_versions = file["gameVersions"]
+            loaders = [name for name in game_versions
+                       if name.lower() in CURSEFORGE_LOADER_TYPES]
+            index.add(file["id"], file["id"],
+                      [name for name in game_versions
+                       if name[:1].isdigit()], loaders)
+
+        def extend_index(index, seen):
+            """
+            Index the next pages of the file listing, several at once
+            unless nothing was indexed yet.
+
+            Args:
+                index (CompatibilityIndex): The index to extend.
+                seen (dict): Collects the fetched files by ID.
+
+            Raises:
+                ValueError: If a page cannot be fetched.
+            """
+            in_flight = FILE_PAGES_IN_FLIGHT if index.scanned else 1
+            indexes = range(index.scanned,
+                            min(index.scanned + page_size * in_flight,
+                                max_results),
+                            page_size)
+            if not indexes:
+                index.complete = True
+                return
+
+            pages = run_concurrently(page_or_none, indexes, limit=in_flight)
+
+            for page in pages:
+                if page is None:
+                    raise ValueError("Unable to list the mod files.")
+
+                for file in page:
+                    index_file(index, file)
+                    seen[file["id"]] = file
+
+                index.scanned += len(page)
+                if len(page) < page_size or index.scanned >= max_results:
+                    index.complete = True
+                    return
+
+        def refresh_index(index, seen):
+            """
+            Index the files published since the index was last refreshed.
+
+            Args:
+                index (CompatibilityIndex): The index to refresh.
+                seen (dict): Collects the fetched files by ID.
+
+            Raises:
+                ValueError: If a page cannot be fetched.
+            """
+            # Indexing moves index.newest, compare with the one before
+            newest = index.newest
+            start = 0
+            while start < max_results:
+                page = files(self.mod_id, index=start)
+                newer = [file for file in page
+                         if newest is None or file["id"] > newest]
+
+                for file in newer:
+                    index_file(index, file)
+                    seen[file["id"]] = file
+                index.scanned += len(newer)
+
+                # Stop at the first file that was already indexed
+                if len(newer) < len(page) or len(page) < page_size:
                     break
+                start += page_size
+
+            index.refreshed = time()
+
+        def latest_compatible_file(mod_id):
+            """
+            Get the latest file compatible with the given config.
+
+            The file is looked up in the compatibility index of the mod,
+            kept in the metadata cache. The index is built from the file
+            listing, newest first, only as far as needed. If the newest
+            page has no compatible file, the API is asked to filter the
+            files before the listing is scanned further. Once the index is
+            older than the cache TTL, only the files published since are
+            fetched.
+
+            Args:
+                mod_id (int): The mod ID.
+
+            Returns:
+                dict: The file as a json object.
+
+            Raises:
+                IncompatibleModError: If no compatible file is found.
+                ValueError: If a page of files cannot be fetched.
+            """
+            url_path = f"/mods/{mod_id}/files"
+            minecraft_version = self.cfg["minecraft_version"]
+            loader = self.cfg["loader"]
+            seen = {}
+            refreshed = False
+
+            index = self._index_get(url_path)
+            if index is None:
+                index = CompatibilityIndex()
+            elif index.is_stale(MetadataCache.from_config(self.cfg).ttl):
+                with suppress(ValueError, KeyError):
+                    refresh_index(index, seen)
+                    refreshed = True
+
+            # Found in the index as it was, nothing to store
+            file_id = index.lookup(minecraft_version, loader)
+            if file_id is not None and not refreshed:
+                return get_file_with_version(mod_id, file_id)
+
+            try:
+
+                if file_id is None and not index.scanned \
+                   and not index.complete:
+                    extend_index(index, seen)
+                    file_id = index.lookup(minecraft_version, loader)
 
-                for file in response:
-                    if compatible_config <= set(file["gameVersions"]):
-                        self.version_id = file["id"]
-                        self._file = file
-                        return self._file
+                if file_id is None and not index.complete:
+                    with suppress(ValueError, KeyError):
+                        file = first_compatible(files(mod_id, filtered=True))
+                        if file is not None:
+                            index.put(file["id"], file["id"],
+                                      minecraft_version, loader)
+                            seen[file["id"]] = file
+                            file_id = file["id"]
 
-            raise ValueError("No compatible file found.")
+                while file_id is None and not index.complete:
+                    extend_index(index, seen)
+                    file_id = index.lookup(minecraft_version, loader)
+
+            finally:
+                self._index_put(url_path, index)
+
+            if file_id is None:
+                raise IncompatibleModError("No compatible file found.")
+
+            if file_id in seen:
+                return seen[file_id]
+            return get_file_with_version(mod_id, file_id)
+
+        # If no version is specified, get the latest compatible file,
+        # failing fast if the mod was found incompatible recently
+        if self.version_id is None:
+            self._file = self._negative_cached(
+                "file", IncompatibleModError,
+                lambda: self._cached_value(
+                    f"/mods/{self.mod_id}/files",
+                    lambda: latest_compatible_file(self.mod_id)))
+            self.version_id = self._file["id"]
+            return self._file
 
         # pylint: disable=R1720
         else:
@@ -440,7 +1062,7 @@ class CurseforgeMod(Mod):
         if self._dependencies is not None:
             return self._dependencies
 
-        dependencies = {CurseforgeMod(dependency["modId"], self.cfg)
+        dependencies = {CurseforgeMod.shared(dependency["modId"], self.cfg)
                         for dependency
                         in self.file["dependencies"]
                         if dependency["modId"] is not None
@@ -488,13 +1110,50 @@ class CurseforgeMod(Mod):
 
         raise ValueError("Unavailable through API")
 
+    @property
+    def hashes(self):
+        """
+        Get the hashes of the file of a mod.
+
+        Returns:
+            dict: The hex digests by algorithm name. {"sha1": "..."}
+
+        Raises:
+            ValueError: If the file lookup fails.
+        """
+        if self._hashes is not None:
+            return self._hashes
+
+        self._hashes = {CURSEFORGE_HASH_ALGOS[file_hash["algo"]]:
+                        file_hash["value"].lower()
+                        for file_hash in self.file.get("hashes", [])
+                        if file_hash["algo"] in CURSEFORGE_HASH_ALGOS}
+        return self._hashes
+
+    @property
+    def size(self):
+        """
+        Get the size of the file of a mod.
+
+        Returns:
+            int: The size in bytes.
+
+        Raises:
+            ValueError: If the file lookup fails.
+        """
+        if self._size is not None:
+            return self._size
+
+        self._size = self.file["fileLength"]
+        return self._size
+
 
 class ModrinthMod(Mod):
     """
     A class representing a mod from modrinth.com.
     """
     BASE_URL = "https://api.modrinth.com/v2"
-    USER_AGENT = "Cursely/testing2 (github.com/julynx/cursely)"
+    PROVIDER = "modrinth"
 
     def __init__(self, mod_id, cfg, *, version_id=None):
         """
@@ -528,6 +1187,8 @@ class ModrinthMod(Mod):
         self._website = None
         self._summary = None
         self._url = None
+        self._hashes = None
+        self._size = None
 
     def __eq__(self, __value: object) -> bool:
         """
@@ -564,39 +1225,106 @@ class ModrinthMod(Mod):
         """
         return hash(self.mod_id)
 
-    def _make_request(self, url_path, tries=DOWNLOAD_RETRIES):
+    def _make_request(self, url_path, params=None, *, first_only=False):
         """
-        Make a request to the modrinth API.
+        Make a request to the modrinth API, retrying as set by the shared
+        retry policy.
 
         Args:
             url_path (str): The url path to the endpoint.
-            tries (int): The number of tries left.
+            params (dict): The query parameters of the request.
+            first_only (bool): The response is a json array and only its
+                first item should be decoded.
 
         Returns:
-            dict: The response as a json object.
+            dict: The response as a json object. If first_only is set,
+                the first item of the array or None if it is empty.
 
         Raises:
             ValueError: If the request fails.
         """
-        while tries > 0:
+        end_point = f"{self.BASE_URL}{url_path}"
+
+        def request():
+            response = http_client().get(end_point, params=params)
+            response.raise_for_status()
+            if first_only:
+                return _first_json_item(response.text)
+            return response.json()
+
+        return retry_policy().run(request)
 
-            end_point = f"{self.BASE_URL}{url_path}"
-            headers = {"Accept": "application/json",
-                       "User-Agent": self.USER_AGENT}
+    @classmethod
+    def hydrate_many(cls, mods):
+        """
+        Fill in the project and pinned version of many mods through the
+        multi-id endpoints GET /v2/projects and GET /v2/versions, in chunks.
 
+        Args:
+            mods (Iterable[ModrinthMod]): The mods to fill in.
+        """
+        mods = [mod for mod in mods
+                if mod._mod is None
+                or (mod._version is None and mod.version_id is not None)]
+        if not mods:
+            return
+
+        # Projects, from the cache or in bulk
+        pending = {}
+        for mod in mods:
+            if mod._mod is None:
+                mod._mod = mod._cache_get(f"/project/{mod.mod_id}")
+            if mod._mod is None:
+                pending.setdefault(mod.mod_id, []).append(mod)
+
+        for chunk in _chunks(list(pending), BULK_CHUNK_SIZE):
+            try:
+                records = mods[0]._make_request(
+                    "/projects", params={"ids": json.dumps(chunk)})
+            except ValueError:
+                continue
+
+            for record in records:
+                for key in (record["id"], record["slug"]):
+                    for mod in pending.pop(key, []):
+                        mod._mod = record
+                        mod._cache_put(f"/project/{mod.mod_id}", record)
+
+        # Pinned versions, from the cache or in bulk
+        pending = {}
+        for mod in mods:
+            if mod._version is not None or mod.version_id is None:
+                continue
+            version = mod._cache_get(f"/version/{mod.version_id}")
+            if version is not None:
+                mod._set_pinned_version(version)
+            else:
+                pending.setdefault(mod.version_id, []).append(mod)
+
+        for chunk in _chunks(list(pending), BULK_CHUNK_SIZE):
             try:
-                response = requests.get(end_point, headers=headers, timeout=1)
-                return response.json()
+                records = mods[0]._make_request(
+                    "/versions", params={"ids": json.dumps(chunk)})
+            except ValueError:
+                continue
 
-            except requests.RequestException:
-                sleep((DOWNLOAD_RETRIES + 1 - tries) / 2)
-                tries -= 1
+            for record in records:
+                for mod in pending.get(record["id"], []):
+                    mod._cache_put(f"/version/{mod.version_id}", record,
+                                   immutable=True)
+                    mod._set_pinned_version(record)
 
-            except Exception:
-                sleep((DOWNLOAD_RETRIES + 1 - tries) / 2)
-                tries -= 1
+    def _set_pinned_version(self, version):
+        """
+        Keep a pinned version if it is compatible with the target config.
+        Incompatible versions are left for the version property to reject.
 
-        raise ValueError("Too many failed requests.")
+        Args:
+            version (dict): The version as a json object.
+        """
+        if self.cfg["minecraft_version"] in version["game_versions"] \
+           and self.cfg["loader"].lower() in version["loaders"]:
+            self._version = version
 
     @property
     def name(self):
@@ -630,7 +1358,7 @@ class ModrinthMod(Mod):
             return self._mod
 
         url_path = f"/project/{self.mod_id}"
-        self._mod = self._make_request(url_path)
+        self._mod = self._cached_project(url_path)
         return self._mod
 
     @property
@@ -687,18 +1415,93 @@ class ModrinthMod(Mod):
         mod_loader = self.cfg["loader"].lower()
 
         url_path = f"/project/{self.mod_id}/version"
-        versions = self._make_request(url_path)
 
-        try:
-            version = next(version
-                           for version in versions
-                           if minecraft_version in version["game_versions"]
-                           and mod_loader in version["loaders"])
-        except StopIteration as stop_iteration:
-            raise ValueError("No compatible version found.") \
-                from stop_iteration
+        def refresh_index(index, seen):
+            """
+            Index the versions of the project that were published since
+            the index was created, fetching only those, in bulk.
+
+            Args:
+                index (CompatibilityIndex): The index to refresh.
+                seen (dict): Collects the fetched versions by ID.
+
+            Raises:
+                ValueError: If the project or versions cannot be fetched.
+            """
+            indexed = set(index.file_ids)
+            new_ids = [version_id for version_id in self.mod["versions"]
+                       if version_id not in indexed]
 
-        self._latest_version = version
+            for chunk in _chunks(new_ids, BULK_CHUNK_SIZE):
+                for version in self._make_request(
+                        "/versions", params={"ids": json.dumps(chunk)}):
+                    index.add(version["id"], version["date_published"],
+                              version["game_versions"], version["loaders"])
+                    seen[version["id"]] = version
+
+            index.file_ids.extend(new_ids)
+            index.refreshed = time()
+
+        def latest_compatible_version():
+            """
+            Get the newest version compatible with the target config.
+
+            The version is looked up in the compatibility index of the mod,
+            kept in the metadata cache. On a miss, the API is asked for the
+            compatible versions, newest first, and only the first one is
+            decoded and added to the index. The index remembers the
+            versions the project had when it was created, so once it is
+            older than the cache TTL only the versions published since are
+            fetched.
+
+            Raises:
+                IncompatibleModError: If no compatible version is found.
+                ValueError: If the request fails.
+            """
+            seen = {}
+            changed = False
+
+            index = self._index_get(url_path)
+            if index is None:
+                index = CompatibilityIndex()
+                with suppress(ValueError, KeyError):
+                    index.file_ids = list(self.mod["versions"])
+            elif index.is_stale(MetadataCache.from_config(self.cfg).ttl):
+                with suppress(ValueError, KeyError):
+                    refresh_index(index, seen)
+                    changed = True
+
+            version_id = index.lookup(minecraft_version, mod_loader)
+            if version_id is None:
+                params = {"loaders": json.dumps([mod_loader]),
+                          "game_versions": json.dumps([minecraft_version])}
+                version = self._make_request(url_path, params=params,
+                                             first_only=True)
+                if version is None:
+                    raise IncompatibleModError("No compatible version found.")
+
+                index.put(version["id"], version["date_published"],
+                          minecraft_version, mod_loader)
+                seen[version["id"]] = version
+                version_id = version["id"]
+                changed = True
+
+            if changed:
+                self._index_put(url_path, index)
+
+            if version_id in seen:
+                return seen[version_id]
+            return self._cached_request(f"/version/{version_id}",
+                                        immutable=True)
+
+        memo_key = (self.mod_id, mod_loader, minecraft_version)
+        if memo_key not in _LATEST_VERSIONS:
+            _LATEST_VERSIONS[memo_key] = self._negative_cached(
+                "file", IncompatibleModError,
+                lambda: self._cached_value(url_path,
+                                           latest_compatible_version))
+
+        self._latest_version = _LATEST_VERSIONS[memo_key]
         return self._latest_version
 
     @property
@@ -717,7 +1520,7 @@ class ModrinthMod(Mod):
 
         if self.version_id is not None:
             url = f"/version/{self.version_id}"
-            version = self._make_request(url)
+            version = self._cached_request(url, immutable=True)
 
             if minecraft_version not in version["game_versions"] or \
                mod_loader not in version["loaders"]:
@@ -767,9 +1570,10 @@ class ModrinthMod(Mod):
         if self._dependencies is not None:
             return self._dependencies
 
-        self._dependencies = {ModrinthMod(dependency["project_id"], self.cfg)
+        self._dependencies = {ModrinthMod.shared(dependency["project_id"],
+                                                 self.cfg)
                               for dependency
-                              in self.latest_version["dependencies"]
+                              in self.version["dependencies"]
                               if dependency["project_id"] is not None
                               and dependency["dependency_type"] == "required"}
 
@@ -812,6 +1616,42 @@ class ModrinthMod(Mod):
         self._url = download_url
         return self._url
 
+    @property
+    def hashes(self):
+        """
+        Get the hashes of the file of a mod.
+
+        Returns:
+            dict: The hex digests by algorithm name.
+                {"sha1": "...", "sha512": "..."}
+
+        Raises:
+            ValueError: If the file lookup fails.
+        """
+        if self._hashes is not None:
+            return self._hashes
+
+        self._hashes = {algo: digest.lower()
+                        for algo, digest in self.file["hashes"].items()}
+        return self._hashes
+
+    @property
+    def size(self):
+        """
+        Get the size of the file of a mod.
+
+        Returns:
+            int: The size in bytes.
+
+        Raises:
+            ValueError: If the file lookup fails.
+        """
+        if self._size is not None:
+            return self._size
+
+        self._size = self.file["size"]
+        return self._size
+
 
 class ModTable:
     """
@@ -906,6 +1746,8 @@ class ModTable:
         """
         self._table.field_names = ["Id", "Name", "Downloads", "Updated"]
 
+        Mod.hydrate(mod for mod in self.mods if mod._name is None)
+
         for mod in sorted(self.mods, key=lambda x: x.downloads, reverse=True):
 
             mod_id = mod.mod_id
@@ -928,6 +1770,7 @@ class ModTable:
         """
         # Mod fields
         mod = self.mods[0]
+        Mod.hydrate([mod])
         mod_id = self._fix_length(mod.mod_id, length=8)
         name = self._fix_length(mod.name, length=self.names_column_width)
         downloads = self._fix_length(numerize(mod.downloads), length=9)
@@ -956,6 +1799,7 @@ class ModTable:
 
         if len(mod_dependencies) != 0:
             self._table.add_rows([[""], ["Required dependencies:"]])
+            Mod.hydrate(mod_dependencies)
 
         for dependency in mod_dependencies:
             mod_id = self._fix_length(dependency.mod_id, length=8)
@@ -0,0 +1,194 @@
+"""
+Contains methods to compare a mods folder with the files a modpack needs,
+so only missing or changed files are downloaded and only stale ones removed.
+"""
+
+import json
+import os
+from contextlib import suppress
+from dataclasses import dataclass, field
+
+from .config import MODS_INDEX_PATH
+from .downloads import Downloadable, file_name
+from .jar_store import JarStore, file_hashes
+
+
+@dataclass
+class FolderEntry:
+    """
+    Represents a file in a mods folder.
+    """
+
+    path: str = None
+    size: int = 0
+    mtime_ns: int = 0
+    hashes: dict = field(default_factory=dict)
+
+
+@dataclass
+class InstallPlan:
+    """
+    Represents the changes needed to bring a mods folder up to date.
+    """
+
+    keep: list[Downloadable] = field(default_factory=list)
+    download: list[Downloadable] = field(default_factory=list)
+    remove: list[str] = field(default_factory=list)
+
+    def __str__(self) -> str:
+        return (f"{len(self.keep)} up to date, "
+                f"{len(self.download)} to download, "
+                f"{len(self.remove)} to remove")
+
+
+class FolderIndex:
+    """
+    Index of the files in a mods folder by name, size and hash.
+
+    Hashes are computed only when needed and remembered across runs
+    for as long as the size and modification time of a file stay the same.
+    """
+
+    def __init__(self, folder: str, index_path=MODS_INDEX_PATH) -> None:
+        self.folder = os.path.abspath(folder)
+        self.index_path = index_path
+        self.entries: dict[str, FolderEntry] = {}
+        self._known = self._load()
+
+        for entry in os.scandir(self.folder):
+            if not entry.is_file():
+                continue
+
+            stat = entry.stat()
+            known = self._known.get(entry.path, {})
+            hashes = {}
+            if known.get("size") == stat.st_size \
+               and known.get("mtime_ns") == stat.st_mtime_ns:
+                hashes = known.get("hashes", {})
+
+            self.entries[entry.name] = FolderEntry(path=entry.path,
+                                                   size=stat.st_size,
+                                                   mtime_ns=stat.st_mtime_ns,
+                                                   hashes=hashes)
+
+    def _load(self) -> dict:
+        """
+        Load the hashes remembered from previous runs.
+
+        Returns:
+            dict: The known files by path.
+        """
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        """
+        Remember the hashes of the indexed files for the next run.
+        """
+        known = {path: entry for path, entry in self._known.items()
+                 if os.path.dirname(path) != self.folder}
+        known.update({entry.path: {"size": entry.size,
+                                   "mtime_ns": entry.mtime_ns,
+                                   "hashes": entry.hashes}
+                      for entry in self.entries.values() if entry.hashes})
+
+        with suppress(OSError):
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            with open(self.index_path, "w", encoding="utf-8") as file:
+                json.dump(known, file)
+
+    def matches(self, name: str, *, size=None, hashes=None) -> bool:
+        """
+        Check if the folder has a file with the given name and contents.
+
+        Args:
+            name (str): The file name.
+            size (int): The expected size in bytes, if known.
+            hashes (dict): The expected hex digests by algorithm, if known.
+
+        Returns:
+            bool: True if the file is present and matches.
+        """
+        entry = self.entries.get(name)
+        if entry is None:
+            return False
+
+        if size is not None and entry.size != size:
+            return False
+
+        key = JarStore.key(hashes or {})
+        if key is None:
+            return True
+
+        algo, digest = key
+        if algo not in entry.hashes:
+            entry.hashes.update(file_hashes(entry.path, [algo]))
+
+        return entry.hashes[algo] == digest
+
+    def contains(self, downloadable: Downloadable) -> bool:
+        """
+        Check if the folder already has the file of a mod or URL.
+
+        Args:
+            downloadable (Downloadable): The mod or URL.
+
+        Returns:
+            bool: True if the file is present and matches.
+        """
+        try:
+            return self.matches(file_name(downloadable),
+                                size=downloadable.size,
+                                hashes=downloadable.hashes)
+        except ValueError:
+            return False
+
+
+def plan_install(downloadables: list[Downloadable], folder: str,
+                 *, index: FolderIndex = None) -> InstallPlan:
+    """
+    Compare a mods folder with the files a modpack needs.
+
+    Files are matched by name, then by size and hash when the provider
+    publishes them. Files in the folder that no downloadable needs are
+    listed for removal.
+
+    Args:
+        downloadables (list[Downloadable]): The mods and URLs to install.
+        folder (str): The mods folder.
+        index (FolderIndex): An index of the folder built earlier.
+
+    Returns:
+        InstallPlan: The files to keep, download and remove.
+    """
+    index = index or FolderIndex(folder)
+    plan = InstallPlan()
+    needed = set()
+
+    for downloadable in downloadables:
+        try:
+            name = file_name(downloadable)
+            hashes = downloadable.hashes
+            size = downloadable.size
+        except ValueError:
+            plan.download.append(downloadable)
+            continue
+
+        needed.add(name)
+
+        if index.matches(name, size=size, hashes=hashes):
+            key = JarStore.key(hashes)
+            downloadable.verified_hashes = dict([key]) if key else None
+            plan.keep.append(downloadable)
+        else:
+            plan.download.append(downloadable)
+
+    plan.remove = [entry.path for name, entry in index.entries.items()
+                   if name not in needed]
+
+    index.save()
+    return plan
+
@@ -0,0 +1,245 @@
+"""
+Contains the per-host rate limiter used by the shared HTTP client.
+"""
+
+import threading
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from time import monotonic, sleep, time
+from typing import Union
+
+import requests
+
+
+@dataclass
+class RateLimitStats:
+    """
+    Statistics of the requests made to a host through the rate limiter.
+    """
+
+    requests: int = 0
+    delayed: int = 0
+    waited: float = 0.0
+    throttled: int = 0
+
+    def __str__(self) -> str:
+        return (f"{self.requests} requests, {self.delayed} delayed "
+                f"for {self.waited:.1f} s, {self.throttled} throttled")
+
+
+class TokenBucket:
+    """
+    Token bucket pacing the requests made to a single host.
+
+    Tokens are refilled at "rate" per second up to "capacity". Every request
+    takes one, waiting for it if the bucket is empty. The rate limit headers
+    of the responses tighten the bucket when the server is closer to its
+    limit than the bucket thinks, and a Retry-After pauses it altogether.
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        """
+        Initialize a TokenBucket object.
+
+        Args:
+            rate (float): The sustained requests per second. Zero or less
+                disables pacing, leaving only Retry-After pauses.
+            capacity (float): The maximum burst of requests.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.stats = RateLimitStats()
+        self._tokens = capacity
+        self._updated = monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        if self.rate > 0:
+            self._tokens = min(self.capacity, self._tokens
+                               + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self) -> float:
+        """
+        Take a token, waiting until one is available.
+
+        Returns:
+            float: The time waited in seconds.
+        """
+        with self._lock:
+            now = monotonic()
+            self._refill(now)
+            wait = max(self._paused_until - now, 0.0)
+
+            if self.rate > 0:
+                self._tokens -= 1
+                if self._tokens < 0:
+                    wait = max(wait, -self._tokens / self.rate)
+
+            self.stats.requests += 1
+            if wait > 0:
+                self.stats.delayed += 1
+                self.stats.waited += wait
+
+        if wait > 0:
+            sleep(wait)
+        return wait
+
+    def pause(self, seconds: float):
+        """
+        Stop handing out tokens for a while.
+
+        Args:
+            seconds (float): The time to pause for.
+        """
+        with self._lock:
+            now = monotonic()
+            self._refill(now)
+            self._tokens = min(self._tokens, 0)
+            self._paused_until = max(self._paused_until, now + seconds)
+
+    def observe(self, response: requests.Response):
+        """
+        Adjust the bucket to the rate limit headers of a response.
+
+        Args:
+            response (requests.Response): The response.
+        """
+        headers = response.headers
+
+        if response.status_code in (429, 503):
+            if response.status_code == 429:
+                with self._lock:
+                    self.stats.throttled += 1
+            retry_after = _retry_after(headers.get("Retry-After"))
+            if retry_after is not None:
+                self.pause(retry_after)
+            elif response.status_code == 429:
+                self.pause(_reset_after(headers) or 1.0)
+            return
+
+        remaining = _header_float(headers, "X-Ratelimit-Remaining")
+        if remaining is None:
+            return
+
+        if remaining <= 0:
+            self.pause(_reset_after(headers) or 1.0)
+            return
+
+        with self._lock:
+            self._refill(monotonic())
+            self._tokens = min(self._tokens, remaining)
+
+
+class RateLimiter:
+    """
+    Registry of the token buckets of every host.
+    """
+
+    def __init__(self, host_rates: dict) -> None:
+        """
+        Initialize a RateLimiter object.
+
+        Args:
+            host_rates (dict): The (rate, capacity) of each host. Hosts not
+                listed are not paced, but still honour Retry-After.
+        """
+        self.host_rates = host_rates
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, host: str) -> TokenBucket:
+        """
+        Get the token bucket of a host.
+
+        Args:
+            host (str): The host name.
+
+        Returns:
+            TokenBucket: The bucket of the host.
+        """
+        with self._lock:
+            if host not in self._buckets:
+                rate, capacity = self.host_rates.get(host, (0, 0))
+                self._buckets[host] = TokenBucket(rate, capacity)
+            return self._buckets[host]
+
+    def stats(self) -> dict[str, RateLimitStats]:
+        """
+        Get the statistics of every host requested so far.
+
+        Returns:
+            dict: The statistics by host name.
+        """
+        with self._lock:
+            return {host: bucket.stats
+                    for host, bucket in self._buckets.items()}
+
+    def reset(self):
+        """
+        Forget every bucket, as after a fork.
+        """
+        with self._lock:
+            self._buckets = {}
+
+
+def _header_float(headers, name: str) -> Union[float, None]:
+    """
+    Read a numeric header.
+
+    Args:
+        headers (Mapping): The response headers.
+        name (str): The header name.
+
+    Returns:
+        float: The value, or None if missing or not a number.
+    """
+    try:
+        return float(headers[name])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _reset_after(headers) -> Union[float, None]:
+    """
+    Read the seconds until the rate limit window resets.
+
+    Args:
+        headers (Mapping): The response headers.
+
+    Returns:
+        float: The seconds, or None if unknown.
+    """
+    reset = _header_float(headers, "X-Ratelimit-Reset")
+    if reset is None:
+        return None
+
+    # Some servers send an epoch timestamp instead of a delay
+    if reset > time() / 2:
+        reset -= time()
+    return max(reset, 0.0)
+
+
+def _retry_after(value: str) -> Union[float, None]:
+    """
+    Parse a Retry-After header, given in seconds or as an HTTP date.
+
+    Args:
+        value (str): The header value.
+
+    Returns:
+        float: The seconds to wait, or None if missing or invalid.
+    """
+    if not value:
+        return None
+
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time(), 0.0)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,239 @@
+"""
+Contains the retry and timeout policy shared by every request made by
+cursely.
+"""
+
+import random
+import threading
+from collections import deque
+from time import monotonic, sleep
+from typing import Any, Callable, Union
+from urllib.parse import urlsplit
+
+import requests
+
+ATTEMPTS = 3
+CONNECT_TIMEOUT = 3.05
+DEF_READ_TIMEOUT = 10.0
+MIN_READ_TIMEOUT = 2.0
+MAX_READ_TIMEOUT = 60.0
+MIN_TIMEOUT = 0.1
+READ_TIMEOUT_FACTOR = 4
+LATENCY_PERCENTILE = 95
+LATENCY_SAMPLES = 128
+BASE_DELAY = 0.25
+MAX_DELAY = 8.0
+DEF_DEADLINE = 60.0
+DOWNLOAD_DEADLINE = 600.0
+
+
+class LatencyTracker:
+    """
+    Keeps the most recent response latencies of every host.
+    """
+
+    def __init__(self, samples=LATENCY_SAMPLES) -> None:
+        self.samples = samples
+        self._latencies = {}
+        self._lock = threading.Lock()
+
+    def add(self, host: str, seconds: float):
+        """
+        Record the latency of a response.
+
+        Args:
+            host (str): The host name.
+            seconds (float): The time until the response headers arrived.
+        """
+        with self._lock:
+            self._latencies.setdefault(
+                host, deque(maxlen=self.samples)).append(seconds)
+
+    def percentile(self, host: str, percent: float):
+        """
+        Get a percentile of the recent latencies of a host.
+
+        Args:
+            host (str): The host name.
+            percent (float): The percentile, between 0 and 100.
+
+        Returns:
+            float: The latency in seconds, or None if there are no samples.
+        """
+        with self._lock:
+            latencies = sorted(self._latencies.get(host, ()))
+
+        if not latencies:
+            return None
+        index = round(percent / 100 * (len(latencies) - 1))
+        return latencies[index]
+
+
+class RetryPolicy:
+    """
+    Retry and timeout policy for requests.
+
+    Connect and read timeouts are separate. The read timeout of each host is
+    a multiple of its 95th percentile latency, within bounds, so slow hosts
+    are not cut off and fast ones fail fast. Failed operations are retried
+    with full-jitter exponential backoff, so concurrent workers do not retry
+    in lockstep, until they run out of attempts or reach their deadline.
+    The timeouts of requests made while an operation runs are cut to the
+    time left before its deadline, so no single try can overrun it.
+    """
+
+    def __init__(self, *, attempts=ATTEMPTS, base_delay=BASE_DELAY,
+                 max_delay=MAX_DELAY, deadline=DEF_DEADLINE) -> None:
+        """
+        Initialize a RetryPolicy object.
+
+        Args:
+            attempts (int): The maximum number of tries of an operation.
+            base_delay (float): The backoff cap after the first failure.
+            max_delay (float): The maximum backoff in seconds.
+            deadline (float): The maximum time an operation can take,
+                retries included, in seconds.
+        """
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.latencies = LatencyTracker()
+        self._local = threading.local()
+
+    def remaining(self) -> Union[float, None]:
+        """
+        Get the time left before the deadline of the operation running in
+        this thread.
+
+        Returns:
+            float: The seconds left, or None if no operation is running.
+        """
+        give_up_at = getattr(self._local, "give_up_at", None)
+        return None if give_up_at is None else give_up_at - monotonic()
+
+    def timeout(self, url: str) -> tuple[float, float]:
+        """
+        Get the timeouts for a request, within the deadline of the
+        operation running in this thread, if any.
+
+        Args:
+            url (str): The URL to request.
+
+        Returns:
+            tuple: The connect and read timeouts in seconds.
+        """
+        read_timeout = DEF_READ_TIMEOUT
+        latency = self.latencies.percentile(urlsplit(url).hostname or "",
+                                            LATENCY_PERCENTILE)
+        if latency is not None:
+            read_timeout = min(max(latency * READ_TIMEOUT_FACTOR,
+                                   MIN_READ_TIMEOUT), MAX_READ_TIMEOUT)
+
+        remaining = self.remaining()
+        if remaining is None:
+            return CONNECT_TIMEOUT, read_timeout
+
+        remaining = max(remaining, MIN_TIMEOUT)
+        return min(CONNECT_TIMEOUT, remaining), min(read_timeout, remaining)
+
+    def observe(self, response: requests.Response):
+        """
+        Record the latency of a response.
+
+        Args:
+            response (requests.Response): The response.
+        """
+        self.latencies.add(urlsplit(response.url).hostname or "",
+                           response.elapsed.total_seconds())
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Get the time to wait before retrying (full jitter).
+
+        Args:
+            attempt (int): The number of failed tries so far, from 1.
+
+        Returns:
+            float: A random delay between zero and the exponential cap.
+        """
+        cap = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return random.uniform(0, cap)
+
+    def run(self, operation: Callable[[], Any], *, deadline=None,
+            message="Too many failed requests.") -> Any:
+        """
+        Run an operation, retrying it when it fails.
+
+        Client errors other than 408 and 429 are not retried, since the
+        same request would fail again.
+
+        Args:
+            operation (Callable): The operation, with no arguments.
+            deadline (float): The maximum time for the operation, retries
+                included. Defaults to the deadline of the policy.
+            message (str): The error message if every try fails.
+
+        Returns:
+            Any: The result of the operation.
+
+        Raises:
+            ValueError: If every try fails or the deadline is reached.
+        """
+        # Nested operations never outlive the one they run in
+        outer_give_up_at = getattr(self._local, "give_up_at", None)
+        give_up_at = monotonic() + (deadline or self.deadline)
+        if outer_give_up_at is not None:
+            give_up_at = min(give_up_at, outer_give_up_at)
+
+        self._local.give_up_at = give_up_at
+        attempt = 0
+
+        try:
+            while True:
+
+                try:
+                    return operation()
+
+                except Exception as error:  # pylint: disable=broad-except
+                    attempt += 1
+                    delay = self.backoff(attempt)
+
+                    if attempt >= self.attempts \
+                       or monotonic() + delay >= give_up_at \
+                       or not _is_retryable(error):
+                        raise ValueError(message) from error
+
+                sleep(delay)
+
+        finally:
+            self._local.give_up_at = outer_give_up_at
+
+
+def _is_retryable(error: Exception) -> bool:
+    """
+    Check if an operation that failed with an error can succeed if retried.
+
+    Args:
+        error (Exception): The error.
+
+    Returns:
+        bool: False for client errors other than timeouts and throttling.
+    """
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        status = error.response.status_code
+        return not 400 <= status < 500 or status in (408, 429)
+    return True
+
+
+_POLICY = RetryPolicy()
+
+
+def retry_policy() -> RetryPolicy:
+    """
+    Get the process-wide retry policy.
+
+    Returns:
+        RetryPolicy: The shared policy.
+    """
+    return _POLICY
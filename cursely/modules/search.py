@@ -2,12 +2,9 @@
 Contains methods to search for mods on Curseforge and Modrinth.
 """
 
-from time import sleep
-
-import requests
-
-from .config import DOWNLOAD_RETRIES
-from .mods import ModrinthMod
+from .http_client import http_client
+from .mods import CurseforgeMod, ModrinthMod
+from .retry import retry_policy
 
 
 class CurseforgeSearch():
@@ -29,13 +26,13 @@ class CurseforgeSearch():
     def __next__(self):
         return next(self.results)
 
-    def _make_request(self, url_path, params=None, tries=DOWNLOAD_RETRIES):
+    def _make_request(self, url_path, params=None):
         """
-        Make a request to the curseforge API.
+        Make a request to the curseforge API, retrying as set by the
+        shared retry policy.
 
         Args:
             url_path (str): The url path to the resource.
-            tries (int): The number of tries left.
 
         Returns:
             dict: The response as a json object.
@@ -43,28 +40,15 @@ class CurseforgeSearch():
         Raises:
             ValueError: If the request fails.
         """
-        while tries > 0:
-
-            end_point = f"{self.BASE_URL}{url_path}"
-            headers = {"Accept": "application/json",
-                       "x-api-key": self.cfg["API_KEY"]}
-
-            try:
-                response = requests.get(end_point,
-                                        params=params,
-                                        headers=headers,
-                                        timeout=1)
-                return response.json()["data"]
+        end_point = f"{self.BASE_URL}{url_path}"
 
-            except requests.RequestException:
-                sleep((DOWNLOAD_RETRIES + 1 - tries) / 2)
-                tries -= 1
+        def request():
+            response = http_client().get(end_point,
+                                         cfg=self.cfg,
+                                         params=params)
+            return response.json()["data"]
 
-            except Exception:
-                sleep((DOWNLOAD_RETRIES + 1 - tries) / 2)
-                tries -= 1
-
-        raise ValueError("Too many failed requests.")
+        return retry_policy().run(request)
 
     def _search(self):
 
@@ -84,7 +68,8 @@ class CurseforgeSearch():
 
         mods = []
         for mod_info in request:
-            mod = ModrinthMod(mod_info["id"], self.cfg)
+            mod = CurseforgeMod.shared(mod_info["id"], self.cfg)
+            mod._mod = mod_info
             mod._name = mod_info["name"]
             mod._downloads = mod_info["downloadCount"]
             mod._last_updated = mod_info["dateModified"][:10]
@@ -113,13 +98,13 @@ class ModrinthSearch():
     def __next__(self):
         return next(self.results)
 
-    def _make_request(self, url_path, params=None, tries=DOWNLOAD_RETRIES):
+    def _make_request(self, url_path, params=None):
         """
-        Make a request to the curseforge API.
+        Make a request to the curseforge API, retrying as set by the
+        shared retry policy.
 
         Args:
             url_path (str): The url path to the resource.
-            tries (int): The number of tries left.
 
         Returns:
             dict: The response as a json object.
@@ -127,28 +112,15 @@ class ModrinthSearch():
         Raises:
             ValueError: If the request fails.
         """
-        while tries > 0:
-
-            end_point = f"{self.BASE_URL}{url_path}"
-            headers = {"Accept": "application/json",
-                       "x-api-key": self.cfg["API_KEY"]}
-
-            try:
-                response = requests.get(end_point,
-                                        params=params,
-                                        headers=headers,
-                                        timeout=1)
-                return response.json()["hits"]
-
-            except requests.RequestException:
-                sleep((DOWNLOAD_RETRIES + 1 - tries) / 2)
-                tries -= 1
+        end_point = f"{self.BASE_URL}{url_path}"
 
-            except Exception:
-                sleep((DOWNLOAD_RETRIES + 1 - tries) / 2)
-                tries -= 1
+        def request():
+            response = http_client().get(end_point,
+                                         cfg=self.cfg,
+                                         params=params)
+            return response.json()["hits"]
 
-        raise ValueError("Too many failed requests.")
+        return retry_policy().run(request)
 
     def _search(self):
 
@@ -167,7 +139,7 @@ class ModrinthSearch():
 
         mods = []
         for mod_info in request:
-            mod = ModrinthMod(mod_info["project_id"], self.cfg)
+            mod = ModrinthMod.shared(mod_info["project_id"], self.cfg)
             mod._name = mod_info["title"]
             mod._downloads = mod_info["downloads"]
             mod._last_updated = mod_info["date_modified"][:10]
@@ -0,0 +1,195 @@
+"""
+Contains the staged install of a modpack, which is built next to the
+mods folder and swapped in with a rename once it is complete.
+"""
+
+import json
+import os
+import shutil
+from contextlib import suppress
+
+from .jar_store import link_or_copy
+
+STAGING_FOLDER = ".cursely-staging"
+PREVIOUS_FOLDER = ".cursely-previous"
+
+
+class StagedInstall:
+    """
+    Represents a modpack build in a staging folder next to the mods folder.
+
+    Mod files are placed in a staging mods folder and modpack config files
+    are extracted to a staging overlay of the Minecraft folder. Committing
+    renames the staging mods folder into place, keeping the previous one
+    for rollback, and then copies the overlay, backing up every file it
+    overwrites.
+    """
+
+    def __init__(self, mods_path: str) -> None:
+        self.mods_path = os.path.abspath(mods_path)
+        self.minecraft_path = os.path.dirname(self.mods_path)
+
+        staging_root = os.path.join(self.minecraft_path, STAGING_FOLDER)
+        previous_root = os.path.join(self.minecraft_path, PREVIOUS_FOLDER)
+
+        self.staging_root = staging_root
+        self.staging_mods_path = os.path.join(staging_root, "mods")
+        self.overlay_path = os.path.join(staging_root, "overlay")
+
+        self.previous_root = previous_root
+        self.previous_mods_path = os.path.join(previous_root, "mods")
+        self.backup_path = os.path.join(previous_root, "overlay")
+        self.added_files_path = os.path.join(previous_root, "added.json")
+
+    def prepare(self, keep: list[str] = None):
+        """
+        Create an empty staging folder.
+
+        Everything in the current mods folder that is not a file, such as
+        the folders some mods keep their data in, is carried over as well,
+        since installs only ever replace the files.
+
+        Args:
+            keep (list[str]): Names of files in the current mods folder to
+                carry over to the staging mods folder.
+        """
+        shutil.rmtree(self.staging_root, ignore_errors=True)
+        os.makedirs(self.staging_mods_path)
+        os.makedirs(self.overlay_path)
+
+        for name in keep or []:
+            link_or_copy(os.path.join(self.mods_path, name),
+                         os.path.join(self.staging_mods_path, name))
+
+        if not os.path.isdir(self.mods_path):
+            return
+
+        for entry in os.scandir(self.mods_path):
+            destination = os.path.join(self.staging_mods_path, entry.name)
+            if entry.is_symlink() and not entry.is_file():
+                os.symlink(os.readlink(entry.path), destination)
+            elif entry.is_dir():
+                shutil.copytree(entry.path, destination, symlinks=True,
+                                copy_function=link_or_copy)
+
+    def discard(self):
+        """
+        Delete the staging folder, leaving the installation untouched.
+        """
+        shutil.rmtree(self.staging_root, ignore_errors=True)
+
+    def commit(self):
+        """
+        Swap the staging mods folder in and apply the config overlay.
+        The current mods folder and every overwritten config file are kept
+        as the previous generation. The staging folder is deleted either
+        way.
+
+        Raises:
+            ValueError: If the mods folders cannot be swapped, in which case
+                they are left as they were, or if the config files cannot
+                be applied, in which case the build can be rolled back.
+        """
+        try:
+            self._swap_mods_folders()
+        except OSError as os_error:
+            self.discard()
+            raise ValueError(f"Unable to swap the mods folders: {os_error}") \
+                from os_error
+
+        # Apply the overlay, backing up what it overwrites
+        added_files = []
+        try:
+            for root, _, names in os.walk(self.overlay_path):
+                relative_root = os.path.relpath(root, self.overlay_path)
+
+                for name in names:
+                    relative_path = os.path.normpath(
+                        os.path.join(relative_root, name))
+                    target = os.path.join(self.minecraft_path, relative_path)
+
+                    if os.path.isfile(target):
+                        backup = os.path.join(self.backup_path, relative_path)
+                        os.makedirs(os.path.dirname(backup), exist_ok=True)
+                        shutil.copy2(target, backup)
+                    else:
+                        added_files.append(relative_path)
+
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    shutil.copy2(os.path.join(root, name), target)
+
+        except OSError as os_error:
+            raise ValueError(f"Unable to apply the config files: {os_error}") \
+                from os_error
+
+        finally:
+            with suppress(OSError):
+                with open(self.added_files_path, "w",
+                          encoding="utf-8") as file:
+                    json.dump(added_files, file)
+            self.discard()
+
+    def _swap_mods_folders(self):
+        """
+        Move the current mods folder to the previous generation and the
+        staging mods folder into its place. The last previous generation
+        is only deleted once the swap succeeds, and restored otherwise.
+
+        Raises:
+            OSError: If a folder cannot be renamed.
+        """
+        old_previous_root = f"{self.previous_root}.old"
+        shutil.rmtree(old_previous_root, ignore_errors=True)
+        if os.path.isdir(self.previous_root):
+            os.rename(self.previous_root, old_previous_root)
+
+        moved = False
+        try:
+            os.makedirs(self.previous_root)
+            if os.path.isdir(self.mods_path):
+                os.rename(self.mods_path, self.previous_mods_path)
+                moved = True
+            os.rename(self.staging_mods_path, self.mods_path)
+
+        except OSError:
+            with suppress(OSError):
+                if moved:
+                    os.rename(self.previous_mods_path, self.mods_path)
+                shutil.rmtree(self.previous_root, ignore_errors=True)
+                if os.path.isdir(old_previous_root):
+                    os.rename(old_previous_root, self.previous_root)
+            raise
+
+        shutil.rmtree(old_previous_root, ignore_errors=True)
+
+    def rollback(self):
+        """
+        Restore the previous generation of the mods folder and of the
+        config files overwritten by the last build. Rolling back again
+        restores the last build's mods folder.
+
+        Raises:
+            ValueError: If there is no previous generation.
+        """
+        if not os.path.isdir(self.previous_mods_path):
+            raise ValueError("No previous build to roll back to.")
+
+        # Swap the mods folders
+        swap_path = os.path.join(self.previous_root, "mods.swap")
+        os.rename(self.mods_path, swap_path)
+        os.rename(self.previous_mods_path, self.mods_path)
+        os.rename(swap_path, self.previous_mods_path)
+
+        # Undo the last overlay
+        with suppress(OSError, ValueError):
+            with open(self.added_files_path, "r", encoding="utf-8") as file:
+                for relative_path in json.load(file):
+                    with suppress(OSError):
+                        os.remove(os.path.join(self.minecraft_path,
+                                               relative_path))
+            os.remove(self.added_files_path)
+
+        if os.path.isdir(self.backup_path):
+            shutil.copytree(self.backup_path, self.minecraft_path,
+                            dirs_exist_ok=True)
+            shutil.rmtree(self.backup_path)